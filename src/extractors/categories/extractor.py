@@ -1,77 +1,79 @@
 from collections.abc import Sequence
+from dataclasses import fields
+from functools import cache
+from time import perf_counter
 from spacy.tokens import Doc, Token
 from typing import cast, Literal
-from ..extractor import BaseExtractor, UMatch
+from ..extractor import BaseExtractor
 from ..markers import is_future, is_hashtagged, is_negated, is_past
-from ..spacyhelpers import ancestors, is_word, left_tokens
+from ..spacyhelpers import ancestor_masks, is_word, left_tokens
 from .categorized import Categorized, CategorizedRole
 from .data import CANCELING_TAGS
 from ..utils import includes
 
 class CategoryExtractor(BaseExtractor):
   exclusive_tags = False
+  early_exit = True # stop at settled fields (the result is the same)
 
   def extract_many(self, text_or_docs: Sequence[str | Doc]) -> list[Categorized]:
     if not text_or_docs:
       return []
-    docs = self.nlp.pipe(text_or_docs) if isinstance(text_or_docs[0], str) else text_or_docs
-    # LATER: `n_process` for multiprocessing
+    docs = self.pipe(text_or_docs) if isinstance(text_or_docs[0], str) else text_or_docs
+    # For multiprocessing, see `pool.ExtractorPool`
     return [self.extract(doc) for doc in docs]
 
   def extract(self, text_or_doc: str | Doc) -> Categorized:
-    doc = self.nlp(text_or_doc) if isinstance(text_or_doc, str) else text_or_doc
+    doc = self.parse(text_or_doc) if isinstance(text_or_doc, str) else text_or_doc
     # pprint(list(self.nlp.tokenizer.explain(text_or_doc)))
     # pprint([{
     #   "token": tok, "pos": tok.pos_, "dep": tok.dep_, "head": tok.head}
     #   for tok in doc if not tok.is_punct
     # ])
 
-    umatches, _ = self.find_umatches(doc)
-
-    # Cancel certain roles by mathed ancestor roles
-    umatches2: list[UMatch] = []
-    for umatch in umatches:
-      cancelingset = next((CANCELING_TAGS[uname] for uname in unfold_names(umatch.name) if uname in CANCELING_TAGS), set())
-      ancs = set(ancestors(umatch.maintoken))
-      if not any(
-        maintok in ancs and set(unfold_names(nm)) & cancelingset and not is_distant(umatch.maintoken, maintok)
-        for nm, _, maintok in umatches
-      ):
-        umatches2.append(umatch)
-    # print("umatches2:", umatches2)
-
-    # Extract roles
-    role: CategorizedRole | None = None
-    is_freelancer, is_lead, is_remote, is_hireable = None, None, None, None
-    for name, _, maintoken in umatches2:
-      if role is None:
-        if name == "Dev" or name.startswith("Dev:"):
-          role = self.check_dev(maintoken)
-        elif name == "Nondev" or name.startswith("Nondev:"):
-          role = self.check_nondev(maintoken)
-        elif name == "Student":
-          role = self.check_student(maintoken)
-        elif name == "Org":
-          role = self.check_organization(maintoken)
-      if is_freelancer is None:
-        if name == "Freelancer":
-          is_freelancer = self.check_freelancer(maintoken)
-      if is_lead is None:
-        if name == "Lead":
-          is_lead = self.check_lead(maintoken)
-      if is_remote is None:
-        if name == "Remote":
-          is_remote = self.check_remote(maintoken)
-      if is_hireable is None:
-        if name == "Hireable":
-          is_hireable = self.check_hireable(maintoken)
-    return Categorized(
-      role = role,
-      is_freelancer = is_freelancer,
-      is_lead = is_lead,
-      is_remote = is_remote,
-      is_hireable = is_hireable,
-    )
+    umatches, _ = self.find_uarrays(doc)
+    t0 = perf_counter() if self.sink else 0.0
+    names, mains = umatches.names(), umatches.mains
+    cancellation: RoleCancellation | None = None # built on the first role which can be canceled
+
+    # Extract roles in main token order. A match is checked (for cancellation and markers) only while
+    # its field is unsettled: only the first settled value of a field counts.
+    categorized = Categorized(role=None, is_freelancer=None, is_lead=None, is_remote=None, is_hireable=None)
+    unsettled = len(fields(Categorized))
+    checked, canceled = 0, 0
+    for k, name in enumerate(names):
+      field = category_field(name)
+      if field is None or getattr(categorized, field) is not None:
+        continue
+      checked += 1
+      if canceling_names(name):
+        cancellation = cancellation or RoleCancellation(doc, names, mains)
+        if cancellation.is_canceled(k):
+          canceled += 1
+          continue
+      value = self.check_match(name, umatches.maintoken(k))
+      if value is not None:
+        setattr(categorized, field, value)
+        unsettled -= 1
+        if not unsettled and self.early_exit:
+          break
+    if self.sink:
+      self.emit("postprocess", t0, checked=checked, canceled=canceled)
+    return categorized
+
+  def check_match(self, name: str, token: Token) -> CategorizedRole | bool | None:
+    """
+    Check a match of a field (see `category_field`)
+    """
+    match getprefix(name):
+      case "Dev": return self.check_dev(token)
+      case "Nondev": return self.check_nondev(token)
+      case "Student": return self.check_student(token)
+      case "Org": return self.check_organization(token)
+      case "Freelancer": return self.check_freelancer(token)
+      case "Lead": return self.check_lead(token)
+      case "Remote": return self.check_remote(token)
+      case "Hireable": return self.check_hireable(token)
+    return None
 
   def check_dev(self, token: Token) -> Literal["Student", "Dev", None]:
     if is_hashtagged(token):
@@ -207,22 +209,83 @@ HEAD_MARKERS = {
 #   "work",
 # }
 
+class RoleCancellation:
+  """
+  Per-doc index for role cancellation (a role is canceled by a matched ancestor role which is not distant).
+  Ancestors and the mains of matches per unfolded name are bitmasks, distances are prefix sums,
+  so a check is a few int operations instead of tree walks over all matches.
+  """
+  __slots__ = ("ancestors", "distances", "mains", "namemasks", "names")
+
+  def __init__(self, doc: Doc, names: Sequence[str], mains: Sequence[int]):
+    self.names = names
+    self.mains = mains
+    self.ancestors = ancestor_masks(doc)
+    self.namemasks: dict[str, int] = {} # unfolded name -> main offsets of its matches
+    for name, main in zip(names, mains, strict=True):
+      for uname in unfold_names(name):
+        self.namemasks[uname] = self.namemasks.get(uname, 0) | 1 << main
+    self.distances = distance_sums(doc)
+
+  def is_canceled(self, k: int) -> bool:
+    main = self.mains[k]
+    candidates = 0
+    for uname in canceling_names(self.names[k]):
+      candidates |= self.namemasks.get(uname, 0)
+    candidates &= self.ancestors[main]
+    while candidates:
+      j = candidates.bit_length() - 1
+      if not self.is_distant(main, j):
+        return True
+      candidates ^= 1 << j
+    return False
+
+  def is_distant(self, i: int, j: int) -> bool:
+    lo, hi = min(i, j), max(i, j)
+    return hi > lo + 1 and self.distances[hi] - self.distances[lo + 1] >= DISTANT
+
+# Distance weights of tokens between two tokens (doubled to sum ints), `DISTANT` and more is distant
+DISTANCE_WEIGHTS = {";": 6, "|": 6, "·": 6, "-": 4, ",": 4, "(": 4}
+DISTANT = 6
+
 def is_distant(token1: Token, token2: Token) -> bool:
   mini = min(token1.i, token2.i)
   maxi = max(token1.i, token2.i)
-  distance: float = 0
-  for tok in token1.doc[mini+1:maxi]:
-    if tok.text in {";", "|", "·"}:
-      distance += 3
-    elif tok.text in {"-", ",", "("}:
-      distance += 2
-    else:
-      distance += 0.5
-  return distance >= 3
+  return sum(DISTANCE_WEIGHTS.get(tok.text, 1) for tok in token1.doc[mini+1:maxi]) >= DISTANT
+
+def distance_sums(doc: Doc) -> list[int]:
+  """
+  Prefix sums of distance weights: the distance of tokens `i:j` is `sums[j] - sums[i]`
+  """
+  sums = [0] * (len(doc) + 1)
+  for tok in doc:
+    sums[tok.i + 1] = sums[tok.i] + DISTANCE_WEIGHTS.get(tok.text, 1)
+  return sums
+
+@cache
+def canceling_names(name: str) -> frozenset[str]:
+  """
+  Names of the roles which cancel a role, by its most specific unfolded name in `CANCELING_TAGS`
+  """
+  return next((frozenset(CANCELING_TAGS[uname]) for uname in unfold_names(name) if uname in CANCELING_TAGS), frozenset())
 
 def getprefix(name: str) -> str:
   return name.split(":")[0]
 
+CATEGORY_FIELDS = {
+  "Dev": "role", "Nondev": "role", "Student": "role", "Org": "role",
+  "Freelancer": "is_freelancer", "Lead": "is_lead", "Remote": "is_remote", "Hireable": "is_hireable",
+}
+
+def category_field(name: str) -> str | None:
+  """
+  Field of `Categorized` a match settles: roles by tagname prefix ("Dev:Web" -> "Dev"), flags by exact tagname
+  """
+  prefix = getprefix(name)
+  if prefix != name and prefix not in {"Dev", "Nondev"}:
+    return None
+  return CATEGORY_FIELDS.get(prefix)
+
 def unfold_names(name: str) -> list[str]:
   # "Nondev:Business:Other" -> ["Nondev:Business:Other", "Nondev:Business", "Nondev"]
   result: list[str] = []
@@ -4,7 +4,8 @@ import pytest
 from spacy import Language
 from ..utils import fix_grammar, normalize
 from .data import TAGS
-from .extractor import Categorized, CategoryExtractor, CategorizedRole
+from ..spacyhelpers import ancestors
+from .extractor import Categorized, CategoryExtractor, CategorizedRole, RoleCancellation, canceling_names, category_field, distance_sums, is_distant, unfold_names
 
 @dataclass
 class Cats(Categorized):
@@ -14,6 +15,58 @@ class Cats(Categorized):
   is_remote: bool | None = None
   is_hireable: bool | None = None
 
+class Test_category_field:
+  def test_smoke(self) -> None:
+    assert category_field("Dev") == category_field("Dev:Web") == category_field("Nondev:Business:Other") == "role"
+    assert category_field("Org") == category_field("Student") == "role"
+    assert category_field("Freelancer") == "is_freelancer"
+    assert category_field("Hireable") == "is_hireable"
+    assert category_field("Org:Other") is None
+    assert category_field("Remote:Other") is None
+    assert category_field("Devops") is None
+
+class Test_RoleCancellation:
+  def test_same_as_walks(self, nlp: Language) -> None:
+    ex = CategoryExtractor(nlp, TAGS)
+    for text in [
+      "Founder & CEO @QualiSage | Team Lead | Senior Full-Stack Developer | 10+ Years",
+      "Freelance lead developer at a startup, open to remote work",
+      "Student; ex Java engineer, freelancer",
+    ]:
+      doc = nlp(fix_grammar(normalize(text)))
+      umatches, _ = ex.find_uarrays(doc)
+      names, mains = umatches.names(), umatches.mains
+      cancellation = RoleCancellation(doc, names, mains)
+      for k, name in enumerate(names):
+        main = doc[mains[k]]
+        expected = any(
+          doc[m] in ancestors(main) and set(unfold_names(nm)) & canceling_names(name) and not is_distant(main, doc[m])
+          for nm, m in zip(names, mains, strict=True)
+        )
+        assert cancellation.is_canceled(k) == expected
+
+  def test_distance_sums(self, nlp: Language) -> None:
+    doc = nlp("Founder; CEO - Team Lead, Senior (Full-Stack) Developer | 10+ Years")
+    cancellation = RoleCancellation(doc, [], [])
+    assert distance_sums(doc)[-1] == sum({";": 6, "-": 4, ",": 4, "(": 4, "|": 6}.get(tok.text, 1) for tok in doc)
+    for i in range(len(doc)):
+      for j in range(len(doc)):
+        assert cancellation.is_distant(i, j) == is_distant(doc[i], doc[j])
+
+class Test_early_exit:
+  def test_same_as_full(self, nlp: Language) -> None:
+    ex = CategoryExtractor(nlp, TAGS)
+    full = CategoryExtractor(nlp, TAGS)
+    full.early_exit = False
+    for text in [
+      "I'm a student and a freelancer",
+      "Freelance lead developer, open to remote work. #hireable",
+      "Founder & CEO @QualiSage | Team Lead | Senior Full-Stack Developer | 10+ Years",
+      "Not a developer, ex freelancer",
+    ]:
+      doc = nlp(fix_grammar(normalize(text)))
+      assert ex.extract(doc) == full.extract(doc)
+
 class Test_CategoryExtractor:
   @pytest.fixture(scope="class")
   def extract(self, nlp: Language):
@@ -0,0 +1,179 @@
+"""
+Parsed docs on disk, by text: a rule-only re-run over the same texts only matches.
+Docs are kept per pipeline fingerprint (model, tokenizer, components), in append-only shards
+of compressed doc records, memory-mapped on read: a lookup decodes one doc. Normalize texts before, as for parsing.
+
+cache = DocCache(nlp, "cache/docs")
+skills = extractor.extract_many(list(cache.pipe(texts)))
+cache.flush()
+"""
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+import hashlib
+from itertools import accumulate, batched
+import mmap
+import os
+from pathlib import Path
+import struct
+import time
+import zlib
+import numpy as np
+from spacy import Language
+from spacy.tokens import Doc
+from typing import Any, cast
+from .snapshots import fingerprint_pipeline
+
+# Components which set extension attributes (not stored in shards), re-run on loaded docs
+EXTENSION_COMPONENTS = ["index_tokens_by_sents"]
+
+KEY_SIZE = 16 # bytes of a text key
+RECORD = struct.Struct(f"<{KEY_SIZE}sQI") # index record: text key, offset and size of the doc in the shard
+
+# Token attributes of a doc record, as in `DocBin` (user data, cats and span groups aren't kept)
+ATTRS: list[int | str] = ["ORTH", "NORM", "TAG", "HEAD", "DEP", "ENT_IOB", "ENT_TYPE", "ENT_KB_ID", "ENT_ID", "LEMMA", "MORPH", "POS", "SENT_START"]
+HEADER = struct.Struct("<II") # tokens, bytes of strings
+
+def encode_doc(doc: Doc) -> bytes:
+  """
+  A doc as a compressed record: its attribute array, spaces and the strings of attribute values.
+  Like a `DocBin` of one doc, without msgpack (its per-call overhead costs more than decoding a short doc).
+  """
+  strings = {
+    string for token in doc for string in (
+      token.text, token.tag_, token.lemma_, token.norm_, str(token.morph),
+      token.dep_, token.ent_type_, token.ent_kb_id_, token.ent_id_,
+    )
+  }
+  strdata = "\0".join(strings).encode()
+  array = doc.to_array(ATTRS).astype(np.uint64)
+  spaces = np.array([bool(token.whitespace_) for token in doc], dtype=bool)
+  return zlib.compress(HEADER.pack(len(doc), len(strdata)) + strdata + array.tobytes() + spaces.tobytes(), 1)
+
+def decode_doc(nlp: Language, data: bytes) -> Doc:
+  data = zlib.decompress(data)
+  size, strsize = HEADER.unpack_from(data)
+  start = HEADER.size + strsize
+  for string in data[HEADER.size:start].decode().split("\0"):
+    nlp.vocab.strings.add(string)
+  array = np.frombuffer(data, np.uint64, size * len(ATTRS), start).reshape((size, len(ATTRS)))
+  spaces = np.frombuffer(data, bool, size, start + array.nbytes)
+  doc = Doc(nlp.vocab, words=[nlp.vocab.strings[orth] for orth in array[:, 0].tolist()], spaces=spaces.tolist())
+  return doc.from_array(ATTRS, cast(Any, array)) # uint64, as `DocBin` passes it
+
+def text_key(text: str) -> bytes:
+  return hashlib.blake2b(text.encode(), digest_size=KEY_SIZE).digest()
+
+@dataclass
+class DocCacheStats:
+  hits: int = 0   # docs read from shards (or pending ones)
+  misses: int = 0 # docs parsed
+  shards: int = 0 # shards mapped
+
+class DocCache:
+  """
+  Parsed docs by text hash, in shards of `shard_size` docs: `<name>.docs` with doc records (see `encode_doc`,
+  about 3x the size of a `DocBin`, compressed per doc) and their index in `<name>.keys` (written last, so only
+  complete shards are seen). Several processes can write to the same dir. A lookup reads one doc from
+  the shard's map, whatever the shard, so random access costs the same as sequential access.
+  New docs are pending in memory until `flush`.
+  """
+
+  def __init__(self, nlp: Language, path: str | Path, shard_size: int = 10_000):
+    self.nlp = nlp
+    self.dir = Path(path) / fingerprint_pipeline(nlp)
+    self.shard_size = shard_size
+    self.index: dict[bytes, tuple[str, int, int]] = {} # text key -> (shard name, offset, size)
+    self.maps: dict[str, mmap.mmap] = {}               # shard name -> map (kept open, pages are cached by the OS)
+    self.pending: dict[bytes, Doc] = {}
+    self.stats = DocCacheStats()
+    self.refresh()
+
+  def __len__(self) -> int:
+    return len(self.index) + len(self.pending)
+
+  def __contains__(self, text: str) -> bool:
+    key = text_key(text)
+    return key in self.index or key in self.pending
+
+  def refresh(self) -> None:
+    """
+    Index the shards in the dir (including ones written by other processes since)
+    """
+    for path in sorted(self.dir.glob("*.keys")):
+      for key, offset, size in RECORD.iter_unpack(path.read_bytes()):
+        self.index.setdefault(key, (path.stem, offset, size))
+
+  def get(self, text: str) -> Doc | None:
+    key = text_key(text)
+    if key in self.pending:
+      self.stats.hits += 1
+      return self.pending[key]
+    location = self.index.get(key)
+    if location is None:
+      return None
+    self.stats.hits += 1
+    name, offset, size = location
+    doc = decode_doc(self.nlp, self.shard_map(name)[offset:offset + size])
+    for name_ in EXTENSION_COMPONENTS:
+      if name_ in self.nlp.pipe_names:
+        doc = self.nlp.get_pipe(name_)(doc)
+    return doc
+
+  def shard_map(self, name: str) -> mmap.mmap:
+    data = self.maps.get(name)
+    if data is None:
+      with open(self.dir / f"{name}.docs", "rb") as file:
+        data = self.maps[name] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) # stays valid after close
+      self.stats.shards += 1
+    return data
+
+  def close(self) -> None:
+    for data in self.maps.values():
+      data.close()
+    self.maps = {}
+
+  def parse(self, text: str) -> Doc:
+    doc = self.get(text)
+    if doc is None:
+      doc = self.add(text, self.nlp(text))
+    return doc
+
+  def pipe(self, texts: Iterable[str], batch_size: int = 256) -> Iterator[Doc]:
+    """
+    Docs of texts, in order: cached ones as they are, the others parsed in batches (and cached)
+    """
+    for batch in batched(texts, batch_size):
+      docs = [self.get(text) for text in batch]
+      misses = list(dict.fromkeys(text for text, doc in zip(batch, docs, strict=True) if doc is None)) # parsed once
+      parsed = {text: self.add(text, doc) for text, doc in zip(misses, self.nlp.pipe(misses), strict=True)}
+      for text, doc in zip(batch, docs, strict=True):
+        yield parsed[text] if doc is None else doc
+
+  def add(self, text: str, doc: Doc) -> Doc:
+    self.stats.misses += 1
+    self.pending.setdefault(text_key(text), doc)
+    if len(self.pending) >= self.shard_size:
+      self.flush()
+    return doc
+
+  def flush(self) -> None:
+    """
+    Write pending docs to a new shard
+    """
+    if not self.pending:
+      return
+    self.dir.mkdir(parents=True, exist_ok=True)
+    name = f"{time.time_ns()}-{os.getpid()}"
+    blobs = [encode_doc(doc) for doc in self.pending.values()]
+    offsets = accumulate((len(blob) for blob in blobs[:-1]), initial=0)
+    records = [(key, offset, len(blob)) for key, offset, blob in zip(self.pending, offsets, blobs, strict=True)]
+    write_atomic(self.dir / f"{name}.docs", b"".join(blobs))
+    write_atomic(self.dir / f"{name}.keys", b"".join(RECORD.pack(*record) for record in records))
+    for key, offset, size in records:
+      self.index.setdefault(key, (name, offset, size))
+    self.pending = {}
+
+def write_atomic(path: Path, data: bytes) -> None:
+  tmppath = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+  tmppath.write_bytes(data)
+  os.replace(tmppath, path)
@@ -0,0 +1,38 @@
+# mypy: disable-error-code=no-untyped-def
+from spacy import Language
+from .doccache import DocCache, decode_doc, encode_doc
+
+TEXTS = ["Senior PHP developer at Google", "Python, AWS. Open to remote work", "Senior PHP developer at Google"]
+
+def parse_attrs(doc):
+  return [(t.text_with_ws, t.head.i, t.dep_, t.pos_, t.tag_, t.lemma_, str(t.morph), t.ent_iob_, t.ent_type_, t.is_sent_start) for t in doc]
+
+class Test_encode_doc:
+  def test_roundtrip(self, nlp: Language) -> None:
+    for text in [*TEXTS, "", "Data  scientist @ Zürich 🙂"]:
+      doc = nlp(text)
+      assert parse_attrs(decode_doc(nlp, encode_doc(doc))) == parse_attrs(doc)
+
+class Test_DocCache:
+  def test_roundtrip(self, nlp: Language, tmp_path) -> None:
+    cache = DocCache(nlp, tmp_path, shard_size=1)
+    docs = list(cache.pipe(TEXTS))
+    assert cache.stats.misses == 2 and docs[2] is docs[0] # parsed once
+    cache.flush()
+    assert len(list(cache.dir.glob("*.keys"))) == 2
+
+    cache = DocCache(nlp, tmp_path)
+    assert len(cache) == 2 and TEXTS[1] in cache
+    cached = list(cache.pipe(TEXTS))
+    assert cache.stats.misses == 0 and cache.stats.hits == 3
+    assert [parse_attrs(doc) for doc in cached] == [parse_attrs(doc) for doc in docs]
+    assert [t._.i for t in cached[1]] == [t._.i for t in docs[1]]
+    assert cache.stats.shards == 2 # docs are read from shards one by one
+    assert cache.parse("Java developer").text == "Java developer"
+    assert cache.stats.misses == 1 and len(cache.pending) == 1
+
+  def test_fingerprint(self, nlp: Language, tmp_path) -> None:
+    cache = DocCache(nlp, tmp_path)
+    with nlp.select_pipes(disable=["ner"]):
+      assert DocCache(nlp, tmp_path).dir != cache.dir
+    assert DocCache(nlp, tmp_path).dir == cache.dir
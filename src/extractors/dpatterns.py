@@ -1,7 +1,7 @@
 import re
 from typing import Any
 from .ppatterns import to_ppatterns
-from .xpatterns import IN, LOWER, ORTH, XPattern, x_orthlower, x_nounlike
+from .xpatterns import IN, LOWER, ORTH, XPattern, canonical_xtoken, x_orthlower, x_nounlike
 
 (LEFT_ID, REL_OP, RIGHT_ID, RIGHT_ATTRS, PHANTOM) = (
   "LEFT_ID", "REL_OP", "RIGHT_ID", "RIGHT_ATTRS", "PHANTOM"
@@ -417,6 +417,21 @@ def to_dpatterns2(phrases: list[str]) -> list[DPattern]:
 # rword > noun / lword
 # rword / noun < lword
 
+def canonical_dpattern(dpattern: DPattern) -> DPattern:
+  """
+  Name nodes by their positions (names are local to a pattern) and canonicalize their attributes,
+  so structurally identical patterns compare equal
+  """
+  ids = {dtoken[RIGHT_ID]: f"n{o}" for o, dtoken in enumerate(dpattern)}
+  return [
+    {
+      **dtoken,
+      **{attr: ids[dtoken[attr]] for attr in [LEFT_ID, RIGHT_ID] if attr in dtoken},
+      **({RIGHT_ATTRS: canonical_xtoken(dtoken[RIGHT_ATTRS])} if RIGHT_ATTRS in dtoken else {}),
+    }
+    for dtoken in dpattern
+  ]
+
 def separate_xphantoms(pattern: XPattern) -> tuple[XPattern, list[int]]:
   newpattern: XPattern = []
   phantoms: list[int] = []
@@ -0,0 +1,24 @@
+# mypy: disable-error-code=no-untyped-def
+from .dpatterns import canonical_dpattern, exp_sequence, to_dpatterns2
+from .xpatterns import canonical_xpattern
+
+class Test_canonical:
+  def test_dpattern(self) -> None:
+    assert canonical_dpattern(exp_sequence("web", "dev")) == [
+      {"RIGHT_ID": "n0", "RIGHT_ATTRS": {"LOWER": "web"}},
+      {"LEFT_ID": "n0", "REL_OP": ".", "RIGHT_ID": "n1", "RIGHT_ATTRS": {"LOWER": "dev"}},
+    ]
+    # Node names don't matter
+    renamed = [{**exp_sequence("web", "dev")[0], "RIGHT_ID": "x"}, {**exp_sequence("web", "dev")[1], "LEFT_ID": "x"}]
+    assert canonical_dpattern(renamed) == canonical_dpattern(exp_sequence("web", "dev"))
+
+  def test_xpattern(self) -> None:
+    assert canonical_xpattern([{"LOWER": {"IN": ["and", "/", "and"]}}, {"POS": "NOUN"}]) == [
+      {"LOWER": {"IN": ["/", "and"]}}, {"POS": "NOUN"}
+    ]
+
+  def test_expansions_dedupe(self) -> None:
+    # "dev(s)>>job" expands to "dev>>job" and "devs>>job"
+    dpatterns = [canonical_dpattern(dpattern) for dpattern in to_dpatterns2(["dev(s)>>job", "dev>>job"])]
+    assert len(dpatterns) == 3
+    assert len({repr(dpattern) for dpattern in dpatterns}) == 2
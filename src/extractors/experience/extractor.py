@@ -1,5 +1,6 @@
 from collections.abc import Generator, Sequence
 import re
+from time import perf_counter
 from spacy.tokens import Doc, Token
 from ..extractor import BaseExtractor, UMatch
 from ..markers import is_future, is_negated, is_past
@@ -12,29 +13,31 @@ class ExperienceExtractor(BaseExtractor):
   def extract_many(self, text_or_docs: Sequence[str | Doc]) -> list[Experience | None]:
     if not text_or_docs:
       return []
-    docs = self.nlp.pipe(text_or_docs) if isinstance(text_or_docs[0], str) else text_or_docs
-    # LATER: `n_process` for multiprocessing
+    docs = self.pipe(text_or_docs) if isinstance(text_or_docs[0], str) else text_or_docs
+    # For multiprocessing, see `pool.ExtractorPool`
     return [self.extract(doc) for doc in docs]
 
   def extract(self, text_or_doc: str | Doc) -> Experience | None:
-    doc = self.nlp(text_or_doc) if isinstance(text_or_doc, str) else text_or_doc
+    doc = self.parse(text_or_doc) if isinstance(text_or_doc, str) else text_or_doc
     # pprint(list(self.nlp.tokenizer.explain(text_or_doc)))
     # pprint([{
     #   "token": tok, "pos": tok.pos_, "dep": tok.dep_, "head": tok.head}
     #   for tok in doc # if not tok.is_punct
     # ])
-    umatches, _ = self.find_umatches(doc)
-    # print("umatches:", umatches)
+    umatches, _ = self.find_uarrays(doc)
+    t0 = perf_counter() if self.sink else 0.0
 
     # Filter negated and future matches
     umatches2 = [
-      umatch for umatch in umatches
-      if not any(pred(umatch.maintoken) for pred in [is_negated, is_future, is_past])
+      umatches.umatch(k) for k in range(len(umatches))
+      if not any(pred(umatches.maintoken(k)) for pred in [is_negated, is_future, is_past])
     ]
     # print("umatches2:", umatches2)
 
     experiences = list(self.parse_experiences(umatches2))
     # print("experiences:", experiences)
+    if self.sink:
+      self.emit("postprocess", t0, filtered=len(umatches) - len(umatches2), experiences=len(experiences))
     match len(experiences):
       case 0: return None
       case 1: return experiences[0]
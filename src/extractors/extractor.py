@@ -1,31 +1,168 @@
-from collections.abc import Callable, Sequence
+from array import array
+from collections.abc import Callable, Iterable, Sequence
 from dataclasses import dataclass
+import hashlib
+from heapq import heappop, heappush
+import json
+from pathlib import Path
 import re
+from time import perf_counter
+import weakref
+from weakref import WeakKeyDictionary
+import spacy
 from spacy import Language
-from spacy.matcher import DependencyMatcher, Matcher, PhraseMatcher
+from spacy.matcher import PhraseMatcher
 from spacy.tokens import Doc, Token
-from typing import Any, NamedTuple, cast
+from typing import Any, Literal, NamedTuple, cast
+from . import dpatterns, ppatterns, xpatterns
 from .ppatterns import to_ppatterns
-from .spacyhelpers import token_level
-from .utils import hash_skillname, uniq2
-from .dpatterns import DPattern, separate_dphantoms, separate_xphantoms, to_dpatterns2
-from .xpatterns import XPattern, literal
+from .doccache import DocCache
+from .instrumentation import Sink, StageEvent
+from .prefilter import AnchoredDependencyMatcher, AnchoredMatcher, PrefilterStats, doc_lowers
+from .snapshots import fingerprint, fingerprint_tokenizer, read_snapshot, write_snapshot
+from .spacyhelpers import doc_tree, token_level
+from .utils import hash_skillname, uniq
+from .dpatterns import DPattern, canonical_dpattern, separate_dphantoms, separate_xphantoms, to_dpatterns2
+from .xpatterns import XPattern, canonical_xpattern, literal
 
+SNAPSHOT_FORMAT = 3 # bump on changes of `Snapshot`
+
+# OMatch and TMatch are hashable (offsets are tuples) to be deduplicated in one dict pass
 class OMatch(NamedTuple):
-  mname: str
-  offsets: list[int]
+  mname: str # can contain ":maybe:..."
+  name: str  # tagname
+  offsets: tuple[int, ...]
 
 class TMatch(NamedTuple):
   name: str
-  tokens: list[Token]
+  offsets: tuple[int, ...]
 
 class UMatch(NamedTuple):
   name: str
   tokens: list[Token]
   maintoken: Token
 
+class UMatchArrays:
+  """
+  Unique matches of a doc as parallel arrays: name ids (in the vocab strings), main token offsets
+  and the bounds of every match in a flat array of token offsets (matches can be sparse).
+  Tokens are only created on request.
+  """
+
+  __slots__ = ("doc", "ends", "mains", "nameids", "offsets", "starts")
+
+  def __init__(self, doc: Doc):
+    self.doc = doc
+    self.nameids = array("Q")
+    self.mains = array("q")
+    self.starts = array("q") # match k has offsets[starts[k]:ends[k]]
+    self.ends = array("q")
+    self.offsets = array("q")
+
+  def __len__(self) -> int:
+    return len(self.mains)
+
+  def append(self, name: str, main: int, offsets: list[int]) -> None:
+    self.nameids.append(self.doc.vocab.strings.add(name))
+    self.mains.append(main)
+    self.starts.append(len(self.offsets))
+    self.offsets.extend(offsets)
+    self.ends.append(len(self.offsets))
+
+  def name(self, k: int) -> str:
+    return self.doc.vocab.strings[self.nameids[k]]
+
+  def names(self) -> list[str]:
+    strings = self.doc.vocab.strings
+    return [strings[nameid] for nameid in self.nameids]
+
+  def maintoken(self, k: int) -> Token:
+    return self.doc[self.mains[k]]
+
+  def tokens(self, k: int) -> list[Token]:
+    doc = self.doc
+    return [doc[i] for i in self.offsets[self.starts[k]:self.ends[k]]]
+
+  def umatch(self, k: int) -> UMatch:
+    return UMatch(self.name(k), self.tokens(k), self.maintoken(k))
+
+  def to_umatches(self) -> list[UMatch]:
+    return [self.umatch(k) for k in range(len(self))]
+
+class MatchEntry(NamedTuple):
+  mname: str               # can contain ":maybe:..."
+  name: str                # tagname
+  phantoms: frozenset[int] # offsets (within a pattern) to exclude from a match
+
+class RawMatches(NamedTuple):
+  pmatches: list[tuple[int, int, int]]   # (match_id, start, end)
+  xmatches: list[tuple[int, int, int]]   # (match_id, start, end)
+  dmatches: list[tuple[int, list[int]]]  # (match_id, offsets)
+
+@dataclass
+class InitTimings:
+  expand: float = 0.0   # seconds spent expanding phrases into patterns
+  tokenize: float = 0.0 # tokenizing phrase patterns (in one batch)
+  load: float = 0.0     # loading patterns into matchers
+
+@dataclass
+class MatcherTimings:
+  docs: int = 0
+  pmatcher: float = 0.0 # seconds, over all docs
+  xmatcher: float = 0.0
+  dmatcher: float = 0.0
+  pmax: float = 0.0     # seconds, the slowest doc
+  xmax: float = 0.0
+  dmax: float = 0.0
+
+  def add(self, pseconds: float, xseconds: float, dseconds: float) -> None:
+    self.docs += 1
+    self.pmatcher += pseconds
+    self.xmatcher += xseconds
+    self.dmatcher += dseconds
+    self.pmax = max(self.pmax, pseconds)
+    self.xmax = max(self.xmax, xseconds)
+    self.dmax = max(self.dmax, dseconds)
+
+  @property
+  def total(self) -> float:
+    return self.pmatcher + self.xmatcher + self.dmatcher
+
+@dataclass
+class PatternCounts:
+  generated: int = 0 # X- and D-patterns generated from phrases
+  unique: int = 0    # of them, loaded into matchers (the rest are duplicates)
+
 type Disambiguate = Callable[[Token], bool]
 
+@dataclass
+class MemoStats:
+  hits: int = 0
+  misses: int = 0
+
+class DisambiguationMemo:
+  """
+  Results of disambiguators per doc, keyed by disambiguator identity and token offset.
+  The same main token is often matched by several ambiguous patterns (or tags sharing a disambiguator).
+  """
+
+  def __init__(self) -> None:
+    self.results: WeakKeyDictionary[Doc, dict[tuple[int, int], bool]] = WeakKeyDictionary()
+    self.stats = MemoStats()
+
+  def __call__(self, disambiguate: Disambiguate, token: Token) -> bool:
+    results = self.results.get(token.doc)
+    if results is None:
+      results = self.results[token.doc] = {}
+    key = (id(disambiguate), token.i) # disambiguators are kept alive by extractors, so ids aren't reused
+    result = results.get(key)
+    if result is None:
+      self.stats.misses += 1
+      result = results[key] = disambiguate(token)
+    else:
+      self.stats.hits += 1
+    return result
+
 @dataclass
 class Tag:
   name: str
@@ -41,26 +178,228 @@ class Tag:
   def ambiguous(self) -> bool:
     return bool(self.disambiguate)
 
+class PlannedPattern(NamedTuple):
+  kind: Literal["p", "x", "d"]
+  tag: Tag
+  mname: str
+  pattern: Any           # phrases to tokenize ("p"), XPattern ("x") or DPattern ("d")
+  phantoms: list[int]
+
+@dataclass
+class Snapshot:
+  """
+  Compiled ruleset of an extractor: everything `init_matchers` derives from tags.
+  Functions can't be pickled, so disambiguators are referenced by tag positions.
+  """
+  fingerprint: str
+  matchtable: dict[str, MatchEntry]            # matcher key -> entry
+  ppatterns: dict[str, list[tuple[int, ...]]]  # matcher key -> phrases as LOWER ids
+  xpatterns: dict[str, list[XPattern]]         # matcher key -> patterns
+  dpatterns: dict[str, list[DPattern]]         # matcher key -> patterns
+  descrs: dict[str, str]
+  exclusives: dict[str, bool]
+  phantoms: dict[str, list[int]]
+  phantomcount: int
+  patterncounts: dict[str, PatternCounts]
+  patternset: set[bytes]
+  disambiguates: dict[str, int]                # mname -> tag position
+
 class BaseExtractor:
   """
   Custom alternative for entity recognition, since the latter is incompatible
   with `DependencyMatcher` and does not provide any disambiguation mechanics.
+
+  With `snapshots` (a private dir), the compiled ruleset is loaded from there, if present
+  for the same tags, or compiled and saved otherwise.
   """
 
-  def __init__(self, nlp: Language, tags: Sequence[Tag]):
+  def __init__(self, nlp: Language, tags: Sequence[Tag], snapshots: str | Path | None = None):
     self.nlp = nlp
     # == Simplicity -> Flexibility ==
     # PMatcher -> XMatcher -> DMatcher
     self.pmatcher = PhraseMatcher(self.nlp.vocab, attr="LOWER") # fastest, direct phrases
-    self.xmatcher = Matcher(self.nlp.vocab)                     # pattern-based
-    self.dmatcher = DependencyMatcher(self.nlp.vocab)           # pattern-based+
+    self.xmatcher = AnchoredMatcher(self.nlp.vocab)             # pattern-based
+    self.dmatcher = AnchoredDependencyMatcher(self.nlp.vocab)   # pattern-based+
+    self.prefilter = PrefilterStats()                           # skipped matchers (by anchors)
+    self.matchertimings: MatcherTimings | None = None           # set to time matchers per doc
     self.descrs: dict[str, str] = {}
     self.exclusives: dict[str, bool] = {}
     self.disambiguates: dict[str, list[Disambiguate]] = {}
     self.phantoms: dict[str, list[int]] = {}
+    self.dismemo = DisambiguationMemo()
+    self.sink: Sink | None = None                # set to record stage timings and counters
+    self.phantomcount = 0                       # last allocated phantom id (ids of removed tags aren't reused)
+    self.matchtable: dict[int, MatchEntry] = {} # match_id -> entry, resolved once to skip name decoding per match
+    self.matchranks: dict[int, int] = {}        # match_id -> position in the match table (kept for removed ones)
+    self.patterncounts: dict[str, PatternCounts] = {} # tagname -> X- and D-patterns, generated and loaded
+    self.patternset: set[bytes] = set()               # digests of loaded X- and D-patterns
+    self.inittimings = InitTimings()
+    self.engine: MultiExtractor | None = None    # set when matching is shared with other extractors
+    self.doccache: DocCache | None = None        # set to take parsed docs of texts from a cache
+    if snapshots is None:
+      self.init_matchers(tags)
+    else:
+      self.init_matchers_cached(tags, Path(snapshots))
+
+  def init_matchers_cached(self, tags: Sequence[Tag], snapshots: Path) -> None:
+    fp = self.fingerprint(tags)
+    path = snapshots / f"{type(self).__name__}-{fp}.pickle"
+    snapshot = read_snapshot(path)
+    if isinstance(snapshot, Snapshot) and snapshot.fingerprint == fp:
+      self.restore(snapshot, tags)
+    else:
+      self.init_matchers(tags)
+      write_snapshot(path, self.snapshot(tags, fp))
+
+  def fingerprint(self, tags: Sequence[Tag]) -> str:
+    """
+    Fingerprint of everything a compiled ruleset depends on: tags, the tokenizer and the compiling code
+    """
+    return fingerprint(
+      SNAPSHOT_FORMAT, spacy.__version__, type(self).__qualname__, fingerprint_tokenizer(self.nlp),
+      *(Path(cast(str, module.__file__)).read_bytes() for module in [dpatterns, ppatterns, xpatterns]),
+      Path(__file__).read_bytes(),
+      tags,
+    )
+
+  def snapshot(self, tags: Sequence[Tag], fp: str) -> Snapshot:
+    strings = self.nlp.vocab.strings
+    pdocs = phrase_patterns(self.pmatcher)
+    keys = [strings[match_id] for match_id in self.matchtable]
+    return Snapshot(
+      fingerprint = fp,
+      matchtable = {strings[match_id]: entry for match_id, entry in self.matchtable.items()},
+      ppatterns = {key: list(pdocs[key]) for key in keys if key in pdocs},
+      xpatterns = {key: self.xmatcher.get(key)[1] for key in keys if key in self.xmatcher},
+      dpatterns = {key: self.dmatcher.get(key)[1] for key in keys if key in self.dmatcher},
+      descrs = self.descrs,
+      exclusives = self.exclusives,
+      phantoms = self.phantoms,
+      phantomcount = self.phantomcount,
+      patterncounts = self.patterncounts,
+      patternset = self.patternset,
+      disambiguates = {
+        attach_maybe(tag.name) if tag.ambiguous else tag.name: t
+        for t, tag in enumerate(tags)
+        if tag.disambiguate is not None
+      },
+    )
+
+  def restore(self, snapshot: Snapshot, tags: Sequence[Tag]) -> None:
+    strings = self.nlp.vocab.strings
+    self.xmatcher = AnchoredMatcher(self.nlp.vocab, validate=False) # validated at compilation, skip the costly (pydantic) check
+    self.descrs = snapshot.descrs
+    self.exclusives = snapshot.exclusives
+    self.phantoms = snapshot.phantoms
+    self.phantomcount = snapshot.phantomcount
+    self.patterncounts = snapshot.patterncounts
+    self.patternset = snapshot.patternset
+    for mname, t in snapshot.disambiguates.items():
+      disambiguate = tags[t].disambiguate
+      assert disambiguate is not None
+      self.disambiguates[mname] = disambiguate if isinstance(disambiguate, list) else [disambiguate]
+    for key, entry in snapshot.matchtable.items():
+      match_id = strings.add(key)
+      self.matchtable[match_id] = entry
+      self.matchranks.setdefault(match_id, len(self.matchranks))
+      if key in snapshot.ppatterns:
+        self.pmatcher.add(key, cast(Any, snapshot.ppatterns[key])) # token ids are accepted as well as Docs
+      if key in snapshot.xpatterns:
+        self.xmatcher.add(key, snapshot.xpatterns[key])
+      if key in snapshot.dpatterns:
+        self.dmatcher.add(key, snapshot.dpatterns[key])
+
+  def add_tags(self, tags: Sequence[Tag]) -> None:
+    """
+    Add tags in place, without rebuilding the extractor. Tags are checked against the loaded ones
+    first, so a failed check leaves the extractor untouched.
+    """
+    self.check_tags(tags)
     self.init_matchers(tags)
+    if self.engine is not None:
+      self.engine.rebuild()
+
+  def remove_tags(self, names: Iterable[str]) -> None:
+    """
+    Remove tags (all their patterns and side table entries) by names, in place
+    """
+    names = set(names)
+    if unknown := names - self.descrs.keys():
+      raise ValueError(f"unknown tags: {sorted(unknown)!r}")
+    strings = self.nlp.vocab.strings
+    for match_id, entry in list(self.matchtable.items()):
+      if entry.name in names:
+        key = strings[match_id]
+        phantoms = self.phantoms.pop(key, [])
+        if key in self.pmatcher:
+          self.pmatcher.remove(key)
+        if key in self.xmatcher:
+          for xpattern in self.xmatcher.get(key)[1]:
+            self.patternset.discard(pattern_digest(["x", entry.mname, xpattern, phantoms]))
+          self.xmatcher.remove(key)
+        if key in self.dmatcher:
+          for dpattern in self.dmatcher.get(key)[1]:
+            self.patternset.discard(pattern_digest(["d", entry.mname, dpattern, phantoms]))
+          self.dmatcher.remove(key)
+        del self.matchtable[match_id]
+    for name in names:
+      del self.descrs[name]
+      del self.exclusives[name]
+      self.disambiguates.pop(name, None)
+      self.disambiguates.pop(attach_maybe(name), None)
+      self.patterncounts.pop(name, None)
+    self.dismemo.results.clear() # ids of dropped disambiguators can be reused
+    if self.engine is not None:
+      self.engine.rebuild()
+
+  def check_tags(self, tags: Sequence[Tag]) -> None:
+    """
+    Check that tags are consistent with each other and with the loaded tags
+    """
+    exclusives = dict(self.exclusives)
+    disambiguates = set(self.disambiguates)
+    for tag in tags:
+      if exclusives.setdefault(tag.name, tag.exclusive) != tag.exclusive:
+        raise ValueError(f"varying `exclusive` at {tag.name!r}")
+      if tag.disambiguate is not None:
+        mname = attach_maybe(tag.name) if tag.ambiguous else tag.name
+        if mname in disambiguates:
+          raise ValueError(f"duplicate `disambiguate` at {tag.name!r}")
+        disambiguates.add(mname)
 
   def init_matchers(self, tags: Sequence[Tag]) -> None:
+    """
+    Compile tags in phases: expand phrases into patterns, tokenize all phrase patterns
+    in one batch, then load patterns into matchers (phrases grouped per matcher key)
+    """
+    t0 = perf_counter()
+    plan = self.plan_patterns(tags)
+    t1 = perf_counter()
+    texts = [text for planned in plan if planned.kind == "p" for text in planned.pattern]
+    pipe = cast(Any, self.nlp.tokenizer).pipe # `tokenizer.pipe` is untyped in Spacy @_@
+    docs = iter(list(pipe(texts)))
+    t2 = perf_counter()
+    pdocs: dict[str, list[Doc]] = {}
+    for planned in plan:
+      if planned.kind == "p":
+        key = self.add_matchentry(planned.tag, planned.mname)
+        pdocs.setdefault(key, []).extend(next(docs) for _ in planned.pattern)
+      elif planned.kind == "x":
+        self.add_xpattern(planned.tag, planned.mname, planned.pattern, planned.phantoms)
+      else:
+        self.add_dpattern(planned.tag, planned.mname, planned.pattern, planned.phantoms)
+    for key, kdocs in pdocs.items():
+      self.pmatcher.add(key, kdocs)
+    t3 = perf_counter()
+    self.inittimings.expand += t1 - t0
+    self.inittimings.tokenize += t2 - t1
+    self.inittimings.load += t3 - t2
+
+  def plan_patterns(self, tags: Sequence[Tag]) -> list[PlannedPattern]:
+    """
+    Update side tables and expand the phrases of tags into patterns, in the order of loading
+    """
+    plan: list[PlannedPattern] = []
     for tag in tags:
       mname = attach_maybe(tag.name) if tag.ambiguous else tag.name
       # Update descriptions
@@ -77,161 +416,401 @@ class BaseExtractor:
       if tag.disambiguate is not None:
         assert mname not in self.disambiguates, f"duplicate `disambiguate` at {tag.name!r}"
         self.disambiguates[mname] = tag.disambiguate if isinstance(tag.disambiguate, list) else [tag.disambiguate]
-      # Update matchers with patterns
+      # Expand phrases into patterns
       for phrase in tag.phrases:
-        if isinstance(phrase, str):
-          if "<" in phrase or (">" in phrase and not "->" in phrase): # hack
-            assert "-" not in phrase, f"Dashes are not supported yet with dep. operations: {phrase!r}"
-            assert " " not in phrase, f"Spaces are not supported yet with dep. operations: {phrase!r}"
-            dpatterns = to_dpatterns2([phrase])
-            for dpattern in dpatterns:
-              dpattern, dphantoms = separate_dphantoms(dpattern)
-              if dphantoms:
-                k = len(self.phantoms) + 1
-                pname = attach_phantom(mname, k)
-                self.phantoms[pname] = dphantoms
-                self.dmatcher.add(pname, [dpattern])
-              else:
-                self.dmatcher.add(mname, [dpattern])
-          else:
-            if re.search("[A-Z]", phrase):
-              self.xmatcher.add(mname, [literal(p) for p in to_ppatterns([phrase])])
-            else:
-              pipe = cast(Any, self.nlp.tokenizer).pipe # `tokenizer.pipe` is untyped in Spacy @_@
-              self.pmatcher.add(mname, list(pipe(to_ppatterns([phrase]))))
-        elif isinstance(phrase, list) and len(phrase):
-          if "RIGHT_ID" in phrase[0]:
-            dpattern, dphantoms = separate_dphantoms(phrase)
-            # print("dpattern:", dpattern)
-            if dphantoms:
-              k = len(self.phantoms) + 1
-              pname = attach_phantom(mname, k)
-              self.phantoms[pname] = dphantoms
-              self.dmatcher.add(pname, [dpattern])
-            else:
-              self.dmatcher.add(mname, [dpattern])
-          else:
-            xpattern, xphantoms = separate_xphantoms(phrase)
-            # print("xpattern:", xpattern)
-            if xphantoms:
-              k = len(self.phantoms) + 1
-              pname = attach_phantom(mname, k)
-              self.phantoms[pname] = xphantoms
-              self.xmatcher.add(pname, [xpattern])
-            else:
-              self.xmatcher.add(mname, [xpattern])
-
-  def find_omatches(self, doc: Doc) -> list[OMatch]:
-    """
-    Find offset-based matches (a union-set of xmatches, pmatches, dmatches)
+        kind = phrase_kind(phrase)
+        if kind == "dphrase":
+          assert isinstance(phrase, str)
+          assert "-" not in phrase, f"Dashes are not supported yet with dep. operations: {phrase!r}"
+          assert " " not in phrase, f"Spaces are not supported yet with dep. operations: {phrase!r}"
+          for dpattern in to_dpatterns2([phrase]):
+            dpattern, dphantoms = separate_dphantoms(dpattern)
+            plan.append(PlannedPattern("d", tag, mname, dpattern, dphantoms))
+        elif kind == "xphrase":
+          assert isinstance(phrase, str)
+          for p in to_ppatterns([phrase]):
+            plan.append(PlannedPattern("x", tag, mname, literal(p), []))
+        elif kind == "pphrase":
+          assert isinstance(phrase, str)
+          plan.append(PlannedPattern("p", tag, mname, to_ppatterns([phrase]), []))
+        elif kind == "dpattern":
+          dpattern, dphantoms = separate_dphantoms(cast(DPattern, phrase))
+          plan.append(PlannedPattern("d", tag, mname, dpattern, dphantoms))
+        elif kind == "xpattern":
+          xpattern, xphantoms = separate_xphantoms(cast(XPattern, phrase))
+          plan.append(PlannedPattern("x", tag, mname, xpattern, xphantoms))
+    return plan
+
+  def add_xpattern(self, tag: Tag, mname: str, xpattern: XPattern, phantoms: list[int]) -> None:
+    xpattern = canonical_xpattern(xpattern)
+    if self.is_new_pattern(tag, ["x", mname, xpattern, phantoms]):
+      self.xmatcher.add(self.add_matchentry(tag, mname, phantoms), [xpattern])
+
+  def add_dpattern(self, tag: Tag, mname: str, dpattern: DPattern, phantoms: list[int]) -> None:
+    dpattern = canonical_dpattern(dpattern)
+    if self.is_new_pattern(tag, ["d", mname, dpattern, phantoms]):
+      self.dmatcher.add(self.add_matchentry(tag, mname, phantoms), [dpattern])
+
+  def is_new_pattern(self, tag: Tag, pattern: list[Any]) -> bool:
+    """
+    Count a generated pattern and check it isn't loaded already. Generated phrase variants
+    often coincide, and a duplicate only adds matcher work for the same matches.
+    """
+    counts = self.patterncounts.setdefault(tag.name, PatternCounts())
+    counts.generated += 1
+    digest = pattern_digest(pattern)
+    if digest in self.patternset:
+      return False
+    self.patternset.add(digest)
+    counts.unique += 1
+    return True
+
+  def add_matchentry(self, tag: Tag, mname: str, phantoms: list[int] | None = None) -> str:
+    """
+    Register a matcher key (`mname`, suffixed if there are phantoms) in the match table
+    """
+    if phantoms:
+      self.phantomcount += 1
+      k = self.phantomcount
+      key = attach_phantom(mname, k)
+      self.phantoms[key] = phantoms
+    else:
+      key = mname
+    match_id = self.nlp.vocab.strings.add(key)
+    self.matchtable[match_id] = MatchEntry(mname, tag.name, frozenset(phantoms or []))
+    self.matchranks.setdefault(match_id, len(self.matchranks))
+    return key
+
+  def parse(self, text: str) -> Doc:
+    return self.doccache.parse(text) if self.doccache else self.nlp(text)
+
+  def pipe(self, texts: Sequence[str | Doc]) -> Iterable[Doc]:
     """
+    Parse texts (callers pass docs as they are)
+    """
+    return self.doccache.pipe(cast(Sequence[str], texts)) if self.doccache else self.nlp.pipe(texts)
+
+  def match(self, doc: Doc) -> RawMatches:
+    """
+    Run the matchers, or take this extractor's share of a combined run (see `MultiExtractor`)
+    """
+    if self.engine is not None:
+      return self.engine.match_for(self, doc)
+    return run_matchers(doc, self.pmatcher, self.xmatcher, self.dmatcher, self.prefilter, self.matchertimings)
+
+  def emit(self, stage: str, t0: float, **counts: int) -> float:
+    """
+    Emit a stage event to the sink (check it's set first), return the stage end time
+    """
+    t1 = perf_counter()
+    cast(Sink, self.sink).emit(StageEvent(type(self).__name__, stage, t1 - t0, counts))
+    return t1
+
+  def find_omatches(self, doc: Doc, rawmatches: RawMatches | None = None) -> list[OMatch]:
+    """
+    Find offset-based matches (a union-set of xmatches, pmatches, dmatches), of `rawmatches` if given
+    """
+    sink = self.sink
+    t0 = perf_counter() if sink else 0.0
     omatches: list[OMatch] = []
-    xmatches = self.xmatcher(doc) if len(self.xmatcher) else []
-    pmatches = self.pmatcher(doc) if len(self.pmatcher) else []
-    dmatches = self.dmatcher(doc) if len(self.dmatcher) else []
-    for pmatch in pmatches:
+    pmatches, xmatches, dmatches = self.match(doc) if rawmatches is None else rawmatches
+    if sink:
+      t0 = self.emit("match", t0, pmatches=len(pmatches), xmatches=len(xmatches), dmatches=len(dmatches))
+    # `PhraseMatcher` orders matches of a span by key hashes, which differ in `MultiExtractor` (renamed keys):
+    # order them as tags are
+    ranks = self.matchranks
+    for pmatch in sorted(pmatches, key=lambda pmatch: (pmatch[1], pmatch[2], ranks[pmatch[0]])):
       [match_id, start, end] = pmatch
-      mname = self.nlp.vocab.strings[match_id]
-      omatches.append(OMatch(mname, list(range(start, end))))
+      entry = self.matchtable[match_id]
+      omatches.append(OMatch(entry.mname, entry.name, tuple(range(start, end))))
     for xmatch in xmatches:
       [match_id, start, end] = xmatch
-      offsets = list(range(start, end)) # global offsets
-      pname = self.nlp.vocab.strings[match_id]
-      if pname in self.phantoms:
-        offsets = [offs for o, offs in enumerate(offsets) if o not in self.phantoms[pname]]
-      mname = detach_phantom(pname) # Can still contain ":maybe"...
-      omatches.append(OMatch(mname, offsets))
+      entry = self.matchtable[match_id]
+      offsets = range(start, end) # global offsets
+      if entry.phantoms:
+        omatches.append(OMatch(entry.mname, entry.name, tuple(
+          offs for o, offs in enumerate(offsets) if o not in entry.phantoms
+        )))
+      else:
+        omatches.append(OMatch(entry.mname, entry.name, tuple(offsets)))
     for dmatch in dmatches:
-      [match_id, offsets] = dmatch # global offsets
-      pname = self.nlp.vocab.strings[match_id]
-      if pname in self.phantoms:
-        offsets = [offs for o, offs in enumerate(offsets) if o not in self.phantoms[pname]]
-      mname = detach_phantom(pname) # Can still contain ":maybe"...
-      omatches.append(OMatch(mname, offsets))
+      [match_id, doffsets] = dmatch # global offsets
+      entry = self.matchtable[match_id]
+      if entry.phantoms:
+        omatches.append(OMatch(entry.mname, entry.name, tuple(
+          offs for o, offs in enumerate(doffsets) if o not in entry.phantoms
+        )))
+      else:
+        omatches.append(OMatch(entry.mname, entry.name, tuple(doffsets)))
     # DMatcher often produces duplicates (graph-based pattern)
-    omatches = uniq2(omatches)
-    # print("omatches:", omatches)
-    return omatches
+    omatches2 = uniq(omatches)
+    # print("omatches2:", omatches2)
+    if sink:
+      self.emit("dedup", t0, omatches=len(omatches2), duplicates=len(omatches) - len(omatches2))
+    return omatches2
 
-  def find_tmatches(self, doc: Doc) -> list[TMatch]:
+  def find_tmatches(self, doc: Doc, rawmatches: RawMatches | None = None) -> list[TMatch]:
     """
     Find token-based matches, preserving only unambiguous
     """
-    omatches = self.find_omatches(doc)
+    omatches = self.find_omatches(doc, rawmatches)
+    sink = self.sink
+    t0 = perf_counter() if sink else 0.0
+    checks, rejected = 0, 0
     tmatches: list[TMatch] = []
     for omatch in omatches:
-      tokens = [doc[offset] for offset in omatch.offsets]
-      maintoken = (
-        tokens[-1]
-        if all([token_level(t) == token_level(tokens[0]) for t in tokens])
-        else min(tokens, key=lambda t: token_level(t))
-      )
-      name = detach_maybe(omatch)
+      name = omatch.name
       if name == omatch.mname:
-        tmatches.append(TMatch(name, tokens))
+        tmatches.append(TMatch(name, omatch.offsets))
       else:
         if name.startswith("-"):
           raise ValueError("disambiguation for negations is not supported yet")
-        if any(disambiguate(maintoken) for disambiguate in self.disambiguates[omatch.mname]):
-          tmatches.append(TMatch(name, tokens))
-    tmatches = uniq2(tmatches)
+        tokens = [doc[offset] for offset in omatch.offsets]
+        maintoken = (
+          tokens[-1]
+          if all([token_level(t) == token_level(tokens[0]) for t in tokens])
+          else min(tokens, key=lambda t: token_level(t))
+        )
+        checks += 1
+        if any(self.dismemo(disambiguate, maintoken) for disambiguate in self.disambiguates[omatch.mname]):
+          tmatches.append(TMatch(name, omatch.offsets))
+        else:
+          rejected += 1
+    tmatches = uniq(tmatches)
+    if sink:
+      t0 = self.emit("disambiguate", t0, checks=checks, rejected=rejected)
     # Discard canceled matches
+    tmatches2 = self.discard_canceled(tmatches)
+    # print("tmatches2:", tmatches2)
+    if sink:
+      self.emit("cancel", t0, tmatches=len(tmatches2), canceled=len(tmatches) - len(tmatches2))
+    return tmatches2
+
+  def discard_canceled(self, tmatches: list[TMatch]) -> list[TMatch]:
+    """
+    Discard matches canceled by other matches. A match can only be canceled by a match
+    sharing a token with it, so candidates are taken from an offset-to-matches index.
+    """
+    soffsets = [frozenset(tmatch.offsets) for tmatch in tmatches]
+    index: dict[int, list[int]] = {}
+    for k, offsets in enumerate(soffsets):
+      for offset in offsets:
+        index.setdefault(offset, []).append(k)
     tmatches2: list[TMatch] = []
-    for tmatch in tmatches:
-      other_tmatches = [tmat for tmat in tmatches if tmatch != tmat]
-      if not any([self.is_canceled_by(tmatch, other_tm) for other_tm in other_tmatches]):
+    for k, tmatch in enumerate(tmatches):
+      candidates = {l for offset in soffsets[k] for l in index[offset] if l != k}
+      if not any(
+        self.is_canceled(tmatch.name, soffsets[k], tmatches[l].name, soffsets[l])
+        for l in candidates
+      ):
         tmatches2.append(tmatch)
-    # print("tmatches2:", tmatches2)
     return tmatches2
 
   def find_umatches(self, doc: Doc) -> tuple[list[UMatch], list[UMatch]]:
     """
     Find unique matches by merging overlapping and/or neighboring matches
     """
+    umatches, unmatches = self.find_uarrays(doc)
+    return umatches.to_umatches(), unmatches.to_umatches()
+
+  def find_uarrays(self, doc: Doc) -> tuple[UMatchArrays, UMatchArrays]:
+    """
+    Find unique matches (as `find_umatches`) in the array form, without creating tokens
+    """
     tmatches = self.find_tmatches(doc)
+    sink = self.sink
+    t0 = perf_counter() if sink else 0.0
     # Merge overlapping and neighboring sets of offsets (for the same tagname)
     _matches = merge_overlapping([
-      (tmatch.name, set([tok.i for tok in tmatch.tokens]))
+      (tmatch.name, set(tmatch.offsets))
       for tmatch in tmatches
     ])
     # print("_matches:", _matches)
-    # Derive umatches with properly sorted tokens from tmatches
-    umatches: list[UMatch] = []
-    unmatches: list[UMatch] = []
+    # Derive umatches with sorted offsets from tmatches
+    depths = doc_tree(doc).depths
+    rows: list[tuple[int, str, list[int]]] = []   # (main offset, name, offsets)
+    unrows: list[tuple[int, str, list[int]]] = []
     for name, offsets in _matches:
-      tokens = [doc[i] for i in sorted(offsets)]
-      maintoken = (
-        tokens[-1]
-        if all([token_level(t) == token_level(tokens[0]) for t in tokens])
-        else min(tokens, key=lambda t: token_level(t))
+      offs = sorted(offsets)
+      level = depths[offs[0]]
+      main = (
+        offs[-1]
+        if all(depths[o] == level for o in offs)
+        else min(offs, key=depths.__getitem__)
       )
       if name.startswith("-"):
-        unmatches.append(UMatch(name, tokens, maintoken))
+        unrows.append((main, name, offs))
       else:
-        umatches.append(UMatch(name, tokens, maintoken))
+        rows.append((main, name, offs))
     # Sort umatches and unmatches by their maintokens' indexes
-    umatches.sort(key=lambda umat: umat.maintoken.i)
-    unmatches.sort(key=lambda umat: umat.maintoken.i)
-    # print("umatches:", umatches)
-    # print("unmatches:", unmatches)
+    rows.sort(key=lambda row: row[0])
+    unrows.sort(key=lambda row: row[0])
+    umatches, unmatches = UMatchArrays(doc), UMatchArrays(doc)
+    for main, name, offs in rows:
+      umatches.append(name, main, offs)
+    for main, name, offs in unrows:
+      unmatches.append(name, main, offs)
+    if sink:
+      self.emit("merge", t0, merged=len(tmatches) - len(_matches), umatches=len(umatches), unmatches=len(unmatches))
     return umatches, unmatches
 
   def is_canceled_by(self, match: TMatch, other_match: TMatch) -> bool:
-    exclusive = self.exclusives[match.name]
-    other_exclusive = self.exclusives[other_match.name]
-    soffsets = {tok.i for tok in match.tokens}
-    other_soffsets = {tok.i for tok in other_match.tokens}
-    if other_match.name in {"-", "-" + match.name}:
+    soffsets = frozenset(match.offsets)
+    other_soffsets = frozenset(other_match.offsets)
+    return self.is_canceled(match.name, soffsets, other_match.name, other_soffsets)
+
+  def is_canceled(self, name: str, soffsets: frozenset[int], other_name: str, other_soffsets: frozenset[int]) -> bool:
+    if other_name == "-" or other_name == "-" + name:
       return bool(soffsets & other_soffsets)
+    exclusive = self.exclusives[name]
+    other_exclusive = self.exclusives[other_name]
     # # TODO potentially prefer longer name (with more dashes) as more precisef
     if soffsets < other_soffsets:
       # Ignore an exclusive match in case of another, wider exclusive match
       return exclusive and other_exclusive
     elif soffsets == other_soffsets:
       # For VPC and AWS-VPC matching "aws ... vpc" we prefer AWS-VPC as more specific
-      return exclusive and other_exclusive and match.name in other_match.name.split("-")
+      return exclusive and other_exclusive and name in other_name.split("-")
     return False
 
+class MultiExtractor:
+  """
+  Match the tags of several extractors in one pass per doc. Their patterns are merged into
+  namespaced matchers (keys prefixed with the extractor's position) and every extractor takes
+  its share of the matches, so its own disambiguation, cancellation and post-processing stay as is.
+
+  MultiExtractor(nlp, [skill_extractor, category_extractor])
+  skill_extractor.extract(doc)    # runs the combined matchers
+  category_extractor.extract(doc) # reuses their matches
+  """
+
+  def __init__(self, nlp: Language, extractors: Sequence[BaseExtractor]):
+    self.nlp = nlp
+    self.extractors = list(extractors)
+    self.prefilter = PrefilterStats()
+    self.matchertimings: MatcherTimings | None = None # set to time the combined matchers per doc
+    for extractor in self.extractors:
+      assert extractor.nlp.vocab is self.nlp.vocab, "extractors must share the vocab"
+      assert extractor.engine is None, "an extractor can't join several engines"
+      extractor.engine = self
+    self.rebuild()
+
+  def rebuild(self) -> None:
+    """
+    (Re)build the combined matchers from the extractors, e.g. after their tags have changed
+    """
+    self.pmatcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+    self.xmatcher = AnchoredMatcher(self.nlp.vocab, validate=False) # patterns are validated by the extractors
+    self.dmatcher = AnchoredDependencyMatcher(self.nlp.vocab)
+    self.routes: dict[int, tuple[int, int]] = {} # combined match_id -> (extractor position, its match_id)
+    self.lastdoc: weakref.ReferenceType[Doc] | None = None
+    self.lastmatches: list[RawMatches] = []
+    for k, extractor in enumerate(self.extractors):
+      self.add_extractor(k, extractor)
+
+  def add_extractor(self, k: int, extractor: BaseExtractor) -> None:
+    strings = self.nlp.vocab.strings
+    pdocs = phrase_patterns(extractor.pmatcher)
+    for match_id in extractor.matchtable:
+      key = strings[match_id]
+      nkey = f"{k}/{key}"
+      self.routes[strings.add(nkey)] = (k, match_id)
+      if key in pdocs:
+        self.pmatcher.add(nkey, cast(Any, list(pdocs[key]))) # token ids are accepted as well as Docs
+      if key in extractor.xmatcher:
+        self.xmatcher.add(nkey, extractor.xmatcher.get(key)[1])
+      if key in extractor.dmatcher:
+        self.dmatcher.add(nkey, extractor.dmatcher.get(key)[1])
+
+  def match_for(self, extractor: BaseExtractor, doc: Doc) -> RawMatches:
+    """
+    Return the matches of `extractor` (with its own match ids), running the combined matchers once per doc
+    """
+    if self.lastdoc is None or self.lastdoc() is not doc:
+      self.lastmatches = self.match(doc)
+      self.lastdoc = weakref.ref(doc)
+    return self.lastmatches[self.extractors.index(extractor)]
+
+  def match(self, doc: Doc) -> list[RawMatches]:
+    """
+    Run the combined matchers and split their matches by extractor
+    """
+    rawmatches = [RawMatches([], [], []) for _ in self.extractors]
+    pmatches, xmatches, dmatches = run_matchers(doc, self.pmatcher, self.xmatcher, self.dmatcher, self.prefilter, self.matchertimings)
+    for match_id, start, end in pmatches:
+      k, mid = self.routes[match_id]
+      rawmatches[k].pmatches.append((mid, start, end))
+    for match_id, start, end in xmatches:
+      k, mid = self.routes[match_id]
+      rawmatches[k].xmatches.append((mid, start, end))
+    for match_id, offsets in dmatches:
+      k, mid = self.routes[match_id]
+      rawmatches[k].dmatches.append((mid, offsets))
+    return rawmatches
+
+  def find_umatches(self, doc: Doc) -> list[tuple[list[UMatch], list[UMatch]]]:
+    """
+    Find unique matches of every extractor, in the order of extractors
+    """
+    return [extractor.find_umatches(doc) for extractor in self.extractors]
+
+type PhraseKind = Literal["pphrase", "xphrase", "dphrase", "xpattern", "dpattern"]
+
+def phrase_kind(phrase: str | XPattern | DPattern) -> PhraseKind | None:
+  if isinstance(phrase, str):
+    if "<" in phrase or (">" in phrase and not "->" in phrase): # hack
+      return "dphrase"
+    return "xphrase" if re.search("[A-Z]", phrase) else "pphrase"
+  elif isinstance(phrase, list) and len(phrase):
+    return "dpattern" if "RIGHT_ID" in phrase[0] else "xpattern"
+  return None
+
+def pattern_digest(pattern: list[Any]) -> bytes:
+  return hashlib.blake2b(json.dumps(pattern, sort_keys=True).encode(), digest_size=16).digest()
+
+def run_matchers(
+  doc: Doc,
+  pmatcher: PhraseMatcher,
+  xmatcher: AnchoredMatcher,
+  dmatcher: AnchoredDependencyMatcher,
+  stats: PrefilterStats,
+  timings: MatcherTimings | None = None,
+) -> RawMatches:
+  """
+  Run matchers on a doc, skipping the `Matcher` and `DependencyMatcher` groups which can't match it.
+  With `timings`, matcher calls are timed (prefiltering isn't).
+  """
+  lowers = doc_lowers(doc)
+  xgroups = 1 if len(xmatcher) else 0
+  xrun = bool(xgroups) and xmatcher.can_match(lowers)
+  dgroups = dmatcher.groups_for(lowers) if len(dmatcher) else []
+  stats.docs += 1
+  stats.groups += xgroups + len(dmatcher.groups)
+  stats.skipped_groups += xgroups - xrun + len(dmatcher.groups) - len(dgroups)
+  if not xrun and not dgroups:
+    stats.skipped_docs += 1
+  if timings is None:
+    return RawMatches(
+      pmatcher(doc) if len(pmatcher) else [],
+      xmatcher(doc) if xrun else [],
+      dmatcher.match_groups(doc, dgroups),
+    )
+  t0 = perf_counter()
+  pmatches = pmatcher(doc) if len(pmatcher) else []
+  t1 = perf_counter()
+  xmatches = xmatcher(doc) if xrun else []
+  t2 = perf_counter()
+  dmatches = dmatcher.match_groups(doc, dgroups)
+  t3 = perf_counter()
+  timings.add(t1 - t0, t2 - t1, t3 - t2)
+  return RawMatches(pmatches, xmatches, dmatches)
+
+def phrase_patterns(pmatcher: PhraseMatcher) -> dict[str, set[tuple[int, ...]]]:
+  """
+  Phrases of a `PhraseMatcher` as token ids per key. They aren't exposed, but go to its pickle state.
+  """
+  return cast(dict[str, set[tuple[int, ...]]], pmatcher.__reduce__()[1][1])
+
 def is_maybe(mname_or_omatch: str | OMatch) -> bool:
   mname = mname_or_omatch if isinstance(mname_or_omatch, str) else mname_or_omatch.mname
   return ":maybe:" in mname
@@ -255,8 +834,11 @@ def detach_phantom(pname: str) -> str:
 type M = tuple[str, set[int]]
 
 def merge_overlapping(matches: list[M]) -> list[M]:
-  # Recursive solution, can be probably be rewritten in imperative `while (True)` style if necessary.
   """
+  Merge overlapping and neighboring sets of offsets (for the same tagname).
+  Merged matches come first (the latest merged in front), followed by untouched matches
+  in their original order.
+
   assert merge_overlapping([
     ("JS", {7}),
     ("Senior", {1, 2}),
@@ -264,22 +846,203 @@ def merge_overlapping(matches: list[M]) -> list[M]:
     ("SQL", {1}),
     ("PHP", {4}),
     ("Senior", {1, 2, 3}),
-  ]) == [("JS", {7}), ('Senior', {1, 2, 3}), ('SQL', {1}), ('PHP', {4})]
+  ]) == [('Senior', {1, 2, 3}), ("JS", {7}), ('SQL', {1}), ('PHP', {4})]
   """
-  rs: list[M] = []
-  for k, (name, offsets) in enumerate(matches):
-    for l, (other_name, other_offsets) in enumerate(matches):
-      if k != l:
-        if name == other_name and (offsets & other_offsets or is_neighboring(offsets, other_offsets)):
-          common_name = name if is_maybe(other_name) else other_name
-          ms = [(common_name, offsets | other_offsets)]
-          ms.extend(match for m, match in enumerate(matches) if m != k and m != l)
-          return merge_overlapping(ms)
-    rs.append((name, offsets))
-  if rs == matches:
+  # Matches with different tagnames never merge, so every group is processed on its own
+  groups: dict[str, list[int]] = {}
+  for k, (name, _) in enumerate(matches):
+    groups.setdefault(name, []).append(k)
+  merged: list[tuple[int, M]] = [] # (position of the first merged match, match)
+  untouched: list[int] = []
+  for ks in groups.values():
+    if len(ks) == 1:
+      untouched.append(ks[0])
+    elif all(is_contiguous(matches[k][1]) for k in ks):
+      merge_sweep(matches, ks, merged, untouched)
+    else:
+      merge_replay(matches, ks, merged, untouched)
+  if not merged:
     return matches
-  else:
-    return merge_overlapping(rs)
+  merged.sort(key=lambda km: km[0], reverse=True)
+  untouched.sort()
+  return [match for _, match in merged] + [matches[k] for k in untouched]
+
+def merge_sweep(matches: list[M], ks: list[int], merged: list[tuple[int, M]], untouched: list[int]) -> None:
+  # Contiguous offsets overlap or neighbor iff their ranges touch, and a union of touching ranges is
+  # a range again. So groups are connected components, found by a single sweep over sorted ranges.
+  components: list[list[int]] = []
+  hi = 0
+  for k in sorted(ks, key=lambda k: min(matches[k][1])):
+    offsets = matches[k][1]
+    if components and min(offsets) <= hi + 1:
+      components[-1].append(k)
+      hi = max(hi, max(offsets))
+    else:
+      components.append([k])
+      hi = max(offsets)
+  for component in components:
+    if len(component) == 1:
+      untouched.append(component[0])
+    else:
+      component.sort()
+      match = matches[component[0]]
+      for k in component[1:]:
+        match = merge_two(match, matches[k])
+      merged.append((component[0], match))
+
+def merge_replay(matches: list[M], ks: list[int], merged: list[tuple[int, M]], untouched: list[int]) -> None:
+  # Sparse offsets (phantoms, dependency patterns) make `is_neighboring` order-dependent,
+  # so replay the pairwise procedure: the first match having a partner merges with its first partner,
+  # the result absorbs partners (latest merged first, then untouched ones) until there are none left.
+  # Partners of large groups are looked up in indexes by offsets and bounds, small ones are scanned.
+  if len(ks) <= REPLAY_SCAN_MAX:
+    merge_replay_scan(matches, ks, merged, untouched)
+    return
+  rest = [matches[k] for k in ks]
+  alive = [True] * len(rest)
+  restindex = PartnerIndex(alive, latest=False)
+  for position, (_, offsets) in enumerate(rest):
+    restindex.add(position, offsets)
+  stack: list[tuple[int, M]] = []
+  stacked: list[bool] = [] # false for stack entries absorbed later
+  stackindex = PartnerIndex(stacked, latest=True)
+  for i, match in enumerate(rest):
+    if not alive[i]:
+      continue
+    # Alive matches before `i` have no partner left, so the first partner of `i` comes after it
+    j = restindex.search(match[1]).find(exclude=i)
+    if j is None:
+      continue
+    alive[i] = alive[j] = False
+    acc = merge_two(match, rest[j])
+    restsearch, stacksearch = restindex.search(acc[1]), stackindex.search(acc[1])
+    while True:
+      s = stacksearch.find()
+      if s is not None:
+        stacked[s] = False
+        other = stack[s][1]
+      else:
+        j = restsearch.find()
+        if j is None:
+          break
+        alive[j] = False
+        other = rest[j]
+      offsets = other[1] - acc[1]
+      acc = merge_two(acc, other)
+      restsearch.add(offsets)
+      stacksearch.add(offsets)
+    stack.append((ks[i], acc))
+    stacked.append(True)
+    stackindex.add(len(stack) - 1, acc[1])
+  merged.extend(entry for entry, is_stacked in zip(stack, stacked, strict=True) if is_stacked)
+  untouched.extend(k for k, is_alive in zip(ks, alive, strict=True) if is_alive)
+
+REPLAY_SCAN_MAX = 16 # group size up to which scans are faster than indexes
+
+def merge_replay_scan(matches: list[M], ks: list[int], merged: list[tuple[int, M]], untouched: list[int]) -> None:
+  rest = [matches[k] for k in ks]
+  alive = [True] * len(rest)
+  stack: list[tuple[int, M]] = []
+  for i, match in enumerate(rest):
+    if not alive[i]:
+      continue
+    j = next((j for j in range(i + 1, len(rest)) if alive[j] and is_mergeable(match, rest[j])), None)
+    if j is None:
+      continue
+    alive[i] = alive[j] = False
+    acc = merge_two(match, rest[j])
+    while True:
+      s = next((s for s in reversed(range(len(stack))) if is_mergeable(acc, stack[s][1])), None)
+      if s is not None:
+        acc = merge_two(acc, stack.pop(s)[1])
+        continue
+      j = next((j for j in range(len(rest)) if alive[j] and is_mergeable(acc, rest[j])), None)
+      if j is not None:
+        alive[j] = False
+        acc = merge_two(acc, rest[j])
+        continue
+      break
+    stack.append((ks[i], acc))
+  merged.extend(stack)
+  untouched.extend(k for k, is_alive in zip(ks, alive, strict=True) if is_alive)
+
+class PartnerIndex:
+  """
+  Matches of a group by offsets and bounds (by position in the group, dead ones are dropped lazily). A match is mergeable
+  with the ones sharing an offset, and neighboring ones: their min or max is next to its min or max.
+  """
+
+  def __init__(self, alive: list[bool], latest: bool):
+    self.alive = alive                          # by position, shared with the caller
+    self.sign = -1 if latest else 1             # partners found first: the latest positions or the earliest ones
+    self.byoffset: dict[int, list[int]] = {}
+    self.bybound: dict[tuple[int, int], list[int]] = {} # (0 for min or 1 for max, value) -> positions
+
+  def add(self, pos: int, offsets: set[int]) -> None:
+    for offset in offsets:
+      self.byoffset.setdefault(offset, []).append(pos)
+    self.bybound.setdefault((0, min(offsets)), []).append(pos)
+    self.bybound.setdefault((1, max(offsets)), []).append(pos)
+
+  def live(self, bucket: list[int] | None) -> list[int]:
+    if not bucket:
+      return []
+    alive = self.alive
+    bucket[:] = [pos for pos in bucket if alive[pos]]
+    return bucket
+
+  def search(self, offsets: set[int]) -> "PartnerSearch":
+    search = PartnerSearch(self, min(offsets), max(offsets))
+    search.add(offsets)
+    return search
+
+class PartnerSearch:
+  """
+  Partners of a growing match in an index: ones sharing an offset are kept in a heap
+  (sharing stays true as the match grows), neighboring ones are looked up by its current bounds
+  """
+
+  def __init__(self, index: PartnerIndex, lo: int, hi: int):
+    self.index = index
+    self.lo, self.hi = lo, hi
+    self.heap: list[int] = [] # positions times the index sign
+
+  def add(self, offsets: set[int]) -> None:
+    """
+    Add offsets the match has gained
+    """
+    if not offsets:
+      return
+    index, heap = self.index, self.heap
+    for offset in offsets:
+      for pos in index.live(index.byoffset.get(offset)):
+        heappush(heap, index.sign * pos)
+    self.lo, self.hi = min(self.lo, min(offsets)), max(self.hi, max(offsets))
+
+  def find(self, exclude: int = -1) -> int | None:
+    index, heap, sign, alive = self.index, self.heap, self.index.sign, self.index.alive
+    while heap and (not alive[sign * heap[0]] or sign * heap[0] == exclude):
+      heappop(heap)
+    best = sign * heap[0] if heap else None
+    lo, hi = self.lo, self.hi
+    for value in {lo - 1, lo + 1, hi - 1, hi + 1}:
+      for bound in (0, 1):
+        for pos in index.live(index.bybound.get((bound, value))):
+          if pos != exclude and (best is None or sign * pos < sign * best):
+            best = pos
+    return best
+
+def merge_two(match: M, other_match: M) -> M:
+  (name, offsets), (other_name, other_offsets) = match, other_match
+  common_name = name if is_maybe(other_name) else other_name
+  return (common_name, offsets | other_offsets)
+
+def is_mergeable(match: M, other_match: M) -> bool:
+  (name, offsets), (other_name, other_offsets) = match, other_match
+  return name == other_name and bool(offsets & other_offsets or is_neighboring(offsets, other_offsets))
+
+def is_contiguous(offsets: set[int]) -> bool:
+  return bool(offsets) and max(offsets) - min(offsets) + 1 == len(offsets)
 
 def is_neighboring(s1: set[int], s2: set[int]) -> bool:
   min1, min2 = min(s1), min(s2)
@@ -0,0 +1,62 @@
+"""
+Benchmark `merge_overlapping` against the former recursive implementation.
+
+$ python -m extractors.extractor_bench
+"""
+from functools import partial
+import random
+import sys
+from timeit import timeit
+from .extractor import M, is_maybe, is_neighboring, merge_overlapping
+
+def merge_overlapping_recursive(matches: list[M]) -> list[M]:
+  """
+  The former implementation, kept as a reference: restarts a full scan and recurses on every merge.
+  """
+  rs: list[M] = []
+  for k, (name, offsets) in enumerate(matches):
+    for l, (other_name, other_offsets) in enumerate(matches):
+      if k != l:
+        if name == other_name and (offsets & other_offsets or is_neighboring(offsets, other_offsets)):
+          common_name = name if is_maybe(other_name) else other_name
+          ms = [(common_name, offsets | other_offsets)]
+          ms.extend(match for m, match in enumerate(matches) if m != k and m != l)
+          return merge_overlapping_recursive(ms)
+    rs.append((name, offsets))
+  if rs == matches:
+    return matches
+  else:
+    return merge_overlapping_recursive(rs)
+
+def random_matches(n: int, seed: int = 0, names: int = 8, sparse: float = 0.1) -> list[M]:
+  """
+  Generate `n` matches over a doc of `4 * n` tokens, some of them sparse (like dependency matches).
+  """
+  rnd = random.Random(seed)
+  matches: list[M] = []
+  for _ in range(n):
+    name = f"Tag{rnd.randrange(names)}"
+    start = rnd.randrange(4 * n)
+    if rnd.random() < sparse:
+      offsets = {start, start + rnd.randint(2, 4)}
+    else:
+      offsets = set(range(start, start + rnd.randint(1, 3)))
+    matches.append((name, offsets))
+  return matches
+
+def main() -> None:
+  sys.setrecursionlimit(100_000)
+  for sparse in [0.0, 0.1]:
+    print(f"sparse matches: {sparse:.0%}")
+    print(f"{'matches':>8} {'recursive, ms':>14} {'current, ms':>12} {'speedup':>8}")
+    for n in [10, 20, 40, 80, 160, 320, 640]:
+      matches = random_matches(n, seed=n, sparse=sparse)
+      assert merge_overlapping(matches) == merge_overlapping_recursive(matches)
+      number = max(1, 2000 // n)
+      old = timeit(partial(merge_overlapping_recursive, matches), number=number) / number * 1000
+      new = timeit(partial(merge_overlapping, matches), number=number) / number * 1000
+      print(f"{n:>8} {old:>14.3f} {new:>12.3f} {old / new:>7.1f}x")
+    print()
+
+if __name__ == "__main__":
+  main()
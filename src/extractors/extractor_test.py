@@ -0,0 +1,241 @@
+# mypy: disable-error-code=no-untyped-def
+import random
+import sys
+import pytest
+import spacy
+from spacy import Language
+from spacy.tokens import Doc
+from .categories.data import TAGS as CATEGORY_TAGS
+from .categories.extractor import CategoryExtractor
+from .experience.data import TAGS as EXPERIENCE_TAGS
+from .experience.extractor import ExperienceExtractor
+from .extractor import BaseExtractor, M, MemoStats, MultiExtractor, PatternCounts, Tag, UMatch, UMatchArrays, merge_overlapping, phrase_kind, phrase_patterns
+from .extractor_bench import merge_overlapping_recursive, random_matches
+from .instrumentation import HistogramSink
+from .skills.data import SKILLS
+from .skills.extractor import SkillExtractor
+from .skills.tag import Tech
+from .title.data import TAGS as TITLE_TAGS
+from .title.extractor import TitleExtractor
+from .utils import fix_grammar, normalize
+
+class Test_merge_overlapping:
+  def test_smoke(self) -> None:
+    assert merge_overlapping([
+      ("JS", {7}),
+      ("Senior", {1, 2}),
+      ("Senior", {1, 3}),
+      ("SQL", {1}),
+      ("PHP", {4}),
+      ("Senior", {1, 2, 3}),
+    ]) == [("Senior", {1, 2, 3}), ("JS", {7}), ("SQL", {1}), ("PHP", {4})]
+
+  def test_neighboring(self) -> None:
+    assert merge_overlapping([("A", {1}), ("A", {2}), ("B", {3}), ("A", {4})]) == [
+      ("A", {1, 2}), ("B", {3}), ("A", {4})
+    ]
+    assert merge_overlapping([("A", {1, 2}), ("A", {3})]) == [("A", {1, 2, 3})]
+    assert merge_overlapping([("A", {1}), ("A", {3})]) == [("A", {1}), ("A", {3})]
+
+  def test_sparse(self) -> None:
+    # {1, 10} neighbors both {9} and {11} but {1, 10, 11} no longer neighbors {9}
+    assert merge_overlapping([("A", {1, 10}), ("A", {11}), ("A", {9})]) == [
+      ("A", {1, 10, 11}), ("A", {9})
+    ]
+
+  def test_same_as_recursive(self) -> None:
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10_000))
+    for seed in range(200):
+      for n in [5, 20, 60]:
+        for sparse in [0.0, 0.3, 1.0]:
+          matches = random_matches(n, seed=seed, names=3, sparse=sparse)
+          assert merge_overlapping(matches) == merge_overlapping_recursive(matches)
+
+  def test_dense_same_as_recursive(self) -> None:
+    # Sparse matches over few tokens: long chains of absorbed partners
+    for seed in range(200):
+      rnd = random.Random(seed)
+      matches: list[M] = []
+      for _ in range(60): # groups above `REPLAY_SCAN_MAX`
+        start = rnd.randrange(40)
+        matches.append((f"Tag{rnd.randrange(2)}", {start, start + rnd.randint(2, 5)} if rnd.random() < 0.5 else {start, start + 1}))
+      assert merge_overlapping(matches) == merge_overlapping_recursive(matches)
+
+TEXTS = [
+  "Senior PHP developer at Google. Freelancer, open to remote work",
+  "I'm a freelance manager. Looking for a job in data science, not a developer!",
+  "Computer/Data Science student; ex Java engineer with 5+ years of experience",
+  "CTO of a startup, 10 years in React and Node.js. #hireable",
+  "ML engineer: LLM fine-tuning, large-language-model apps in Python",
+]
+
+def create_extractors(nlp: Language) -> list[BaseExtractor]:
+  return [
+    SkillExtractor(nlp, SKILLS),
+    CategoryExtractor(nlp, CATEGORY_TAGS),
+    TitleExtractor(nlp, TITLE_TAGS),
+    ExperienceExtractor(nlp, EXPERIENCE_TAGS),
+  ]
+
+class Test_MultiExtractor:
+  @pytest.fixture(scope="class")
+  def docs(self, nlp: Language):
+    return list(nlp.pipe(fix_grammar(normalize(text)) for text in TEXTS))
+
+  def test_same_as_separate(self, nlp: Language, docs) -> None:
+    separate = create_extractors(nlp)
+    combined = create_extractors(nlp)
+    multi = MultiExtractor(nlp, combined)
+    skills, skills2 = separate[0], combined[0]
+    assert isinstance(skills, SkillExtractor) and isinstance(skills2, SkillExtractor)
+    for doc in docs:
+      assert multi.find_umatches(doc) == [ex.find_umatches(doc) for ex in separate]
+      assert skills2.extract(doc) == skills.extract(doc)
+
+  def test_shared_phrases(self, nlp: Language) -> None:
+    # Matches of the same span in the order of tags, not of (renamed) matcher keys
+    tags = [Tag(f"Tag{k}", ["python dev"], "", False, None) for k in range(8)]
+    separate = BaseExtractor(nlp, tags)
+    multi = MultiExtractor(nlp, [BaseExtractor(nlp, tags[:1]), BaseExtractor(nlp, tags)])
+    doc = nlp("Senior python dev")
+    assert [omatch.name for omatch in separate.find_omatches(doc)] == [tag.name for tag in tags]
+    assert multi.find_umatches(doc)[1] == separate.find_umatches(doc)
+
+  def test_runs_once_per_doc(self, nlp: Language, docs) -> None:
+    multi = MultiExtractor(nlp, create_extractors(nlp)[1:3])
+    matches = multi.match_for(multi.extractors[0], docs[0])
+    assert multi.match_for(multi.extractors[0], docs[0]) is matches
+    assert multi.match_for(multi.extractors[0], docs[1]) is not matches
+
+class Test_snapshots:
+  def test_same_as_compiled(self, nlp: Language, tmp_path) -> None:
+    docs = list(nlp.pipe(fix_grammar(normalize(text)) for text in TEXTS))
+    compiled = CategoryExtractor(nlp, CATEGORY_TAGS)
+    saved = CategoryExtractor(nlp, CATEGORY_TAGS, tmp_path)
+    restored = CategoryExtractor(nlp, CATEGORY_TAGS, tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert restored.matchtable == compiled.matchtable
+    assert restored.disambiguates == compiled.disambiguates
+    for doc in docs:
+      assert saved.find_umatches(doc) == compiled.find_umatches(doc)
+      assert restored.find_umatches(doc) == compiled.find_umatches(doc)
+
+  def test_stale(self, nlp: Language, tmp_path) -> None:
+    CategoryExtractor(nlp, CATEGORY_TAGS, tmp_path)
+    CategoryExtractor(nlp, CATEGORY_TAGS[:-1], tmp_path)
+    assert len(list(tmp_path.iterdir())) == 2
+
+class Test_phrase_kind:
+  def test_smoke(self) -> None:
+    assert phrase_kind("web dev(s)") == "pphrase"
+    assert phrase_kind("AWS-VPC") == "xphrase"
+    assert phrase_kind("web<~dev") == "dphrase"
+    assert phrase_kind("dev(s)>>job") == "dphrase"
+    assert phrase_kind("c->c++") == "pphrase"
+    assert phrase_kind([{"LOWER": "go"}]) == "xpattern"
+    assert phrase_kind([{"RIGHT_ID": "go", "RIGHT_ATTRS": {"LOWER": "go"}}]) == "dpattern"
+    assert phrase_kind([]) is None
+
+class Test_inittimings:
+  def test_phases(self, nlp: Language) -> None:
+    ex = SkillExtractor(nlp, [Tech("Web", ["web dev(s)", "web<~dev"]), Tech("AWS", ["AWS"])])
+    assert ex.inittimings.expand > 0 and ex.inittimings.tokenize > 0 and ex.inittimings.load > 0
+    assert [len(docs) for docs in phrase_patterns(ex.pmatcher).values()] == [2]
+
+class Test_dismemo:
+  def test_hits(self, nlp: Language) -> None:
+    calls: list[int] = []
+    def is_lang(token) -> bool:
+      calls.append(token.i)
+      return True
+    ex = SkillExtractor(nlp, [
+      Tech("Go", ["go"], disambiguate=is_lang),
+      Tech("Golang", ["go"], disambiguate=is_lang),
+    ])
+    doc = nlp("Go developer")
+    assert ex.find_tmatches(doc) == ex.find_tmatches(doc)
+    assert calls == [0]
+    assert ex.dismemo.stats == MemoStats(hits=3, misses=1)
+
+class Test_sink:
+  def test_stages(self, nlp: Language) -> None:
+    sink = HistogramSink()
+    ex = SkillExtractor(nlp, [Tech("Go", ["go", "golang"], disambiguate=lambda _: False), Tech("PHP", ["php"])])
+    ex.sink = sink
+    assert ex.extract("PHP and Go developer") == ["PHP"]
+    assert [stage for _, stage in sink.histograms] == ["match", "dedup", "disambiguate", "cancel", "merge", "postprocess"]
+    assert sink.histograms[("SkillExtractor", "disambiguate")].totals == {"checks": 1, "rejected": 1}
+    assert sink.histograms[("SkillExtractor", "postprocess")].totals == {"resolved": 0, "skills": 1}
+
+class Test_UMatchArrays:
+  def test_smoke(self) -> None:
+    doc = Doc(spacy.blank("en").vocab, words=["senior", "web", "developer", "at", "google"])
+    umatches = UMatchArrays(doc)
+    umatches.append("Dev", 2, [0, 2])
+    umatches.append("Org", 4, [4])
+    assert len(umatches) == 2 and umatches.names() == ["Dev", "Org"]
+    assert umatches.umatch(0) == UMatch("Dev", [doc[0], doc[2]], doc[2])
+    assert umatches.to_umatches()[1] == UMatch("Org", [doc[4]], doc[4])
+
+  def test_same_as_umatches(self, nlp: Language) -> None:
+    docs = list(nlp.pipe(fix_grammar(normalize(text)) for text in TEXTS))
+    for ex in create_extractors(nlp):
+      for doc in docs:
+        umatches, unmatches = ex.find_uarrays(doc)
+        assert (umatches.to_umatches(), unmatches.to_umatches()) == ex.find_umatches(doc)
+
+class Test_patterncounts:
+  def test_duplicates(self, nlp: Language) -> None:
+    ex = SkillExtractor(nlp, [
+      Tech("Web", ["web<~dev", "web<~dev", "web<dev"]),
+      Tech("Job", ["dev(s)>>job", "dev>>job"]),
+    ])
+    assert ex.patterncounts["Web"] == PatternCounts(generated=22, unique=9)
+    assert ex.patterncounts["Job"] == PatternCounts(generated=3, unique=2)
+    assert sum(len(patterns) for patterns in ex.dmatcher.patterns.values()) == 11
+
+class Test_add_remove_tags:
+  @pytest.fixture(scope="class")
+  def docs(self, nlp: Language):
+    return list(nlp.pipe(fix_grammar(normalize(text)) for text in TEXTS))
+
+  def test_same_as_compiled(self, nlp: Language, docs) -> None:
+    compiled = SkillExtractor(nlp, SKILLS)
+    added = SkillExtractor(nlp, SKILLS[::2])
+    added.add_tags(SKILLS[1::2])
+    removed = SkillExtractor(nlp, [*SKILLS, Tech("Zope", ["zope", [{"LOWER": "zope"}, {"LOWER": "dev", "PHANTOM": True}]])])
+    removed.remove_tags(["Zope"])
+    assert removed.matchtable == compiled.matchtable
+    assert removed.patternset == compiled.patternset and removed.patterncounts == compiled.patterncounts
+    for doc in docs:
+      assert sorted(added.extract(doc)) == sorted(compiled.extract(doc))
+      assert removed.extract(doc) == compiled.extract(doc)
+
+  def test_phantom_ids(self, nlp: Language) -> None:
+    ex = SkillExtractor(nlp, [
+      Tech("Web", [[{"LOWER": "web"}, {"LOWER": "dev", "PHANTOM": True}]]),
+      Tech("Go", [[{"LOWER": "go"}, {"LOWER": "lang", "PHANTOM": True}]]),
+    ])
+    ex.remove_tags(["Web"])
+    ex.add_tags([Tech("Rust", [[{"LOWER": "rust"}, {"LOWER": "lang", "PHANTOM": True}]])])
+    assert list(ex.phantoms) == ["Go:ph2", "Rust:ph3"]
+
+  def test_checks(self, nlp: Language) -> None:
+    ex = SkillExtractor(nlp, [Tech("Go", ["golang"])])
+    with pytest.raises(ValueError, match="varying `exclusive`"):
+      ex.add_tags([Tech("Rust", ["rust"]), Tech("Go", ["go"], exclusive=False)])
+    with pytest.raises(ValueError, match="duplicate `resolve`"):
+      ex.add_tags([Tech("Rust", ["rust"], resolve=["Rust"]), Tech("Rust", ["rustlang"], resolve=["Rust"])])
+    with pytest.raises(ValueError, match="unknown tags"):
+      ex.remove_tags(["Rust"])
+    assert set(ex.descrs) == {"Go"}
+
+  def test_engine(self, nlp: Language, docs) -> None:
+    separate = create_extractors(nlp)[:2]
+    combined = create_extractors(nlp)[:2]
+    multi = MultiExtractor(nlp, combined)
+    for ex in [separate[0], combined[0]]:
+      ex.remove_tags(["PHP"])
+      ex.add_tags([Tech("Zope", ["zope"])])
+    for doc in docs:
+      assert multi.find_umatches(doc) == [ex.find_umatches(doc) for ex in separate]
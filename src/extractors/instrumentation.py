@@ -0,0 +1,103 @@
+from bisect import bisect_left
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+from typing import IO, NamedTuple, Protocol
+
+# Stages of an extraction, in order:
+# match        – matchers run (raw matches per matcher)
+# dedup        – raw matches turned into offset matches, duplicates dropped
+# disambiguate – ambiguous matches checked
+# cancel       – matches canceled by other matches
+# merge        – overlapping and neighboring matches merged
+# postprocess  – extractor-specific filtering and resolution (markers, resolve, etc.)
+
+class StageEvent(NamedTuple):
+  extractor: str         # extractor class name
+  stage: str
+  seconds: float         # wall time
+  counts: dict[str, int] # stage-specific counters
+
+class Sink(Protocol):
+  def emit(self, event: StageEvent) -> None: ...
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+@dataclass
+class Histogram:
+  buckets: list[int]  # events per bucket (not cumulative), the last one is +Inf
+  count: int = 0
+  sum: float = 0.0
+  totals: dict[str, int] = field(default_factory=dict) # summed counters
+
+class HistogramSink:
+  """
+  Keep a wall time histogram and counter totals per extractor and stage, in memory
+  """
+
+  def __init__(self, buckets: Sequence[float] = BUCKETS):
+    self.bounds = list(buckets)
+    self.histograms: dict[tuple[str, str], Histogram] = {}
+
+  def emit(self, event: StageEvent) -> None:
+    key = (event.extractor, event.stage)
+    histogram = self.histograms.get(key)
+    if histogram is None:
+      histogram = self.histograms[key] = Histogram([0] * (len(self.bounds) + 1))
+    histogram.buckets[bisect_left(self.bounds, event.seconds)] += 1 # `le` bounds are inclusive
+    histogram.count += 1
+    histogram.sum += event.seconds
+    for name, count in event.counts.items():
+      histogram.totals[name] = histogram.totals.get(name, 0) + count
+
+class JsonlSink:
+  """
+  Append every event as a JSON line to a file
+  """
+
+  def __init__(self, path: str | Path):
+    self.file: IO[str] = open(path, "a")
+
+  def emit(self, event: StageEvent) -> None:
+    self.file.write(json.dumps(event._asdict()) + "\n")
+
+  def close(self) -> None:
+    self.file.close()
+
+class PrometheusSink(HistogramSink):
+  """
+  Histograms in the Prometheus text format, dumped to a local file (e.g. for the node exporter's textfile collector)
+  """
+
+  def __init__(self, path: str | Path, buckets: Sequence[float] = BUCKETS):
+    super().__init__(buckets)
+    self.path = Path(path)
+
+  def dump(self) -> None:
+    tmppath = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+    tmppath.write_text(self.format())
+    os.replace(tmppath, self.path)
+
+  def format(self) -> str:
+    lines = [
+      "# HELP extractors_stage_seconds Wall time of extraction stages",
+      "# TYPE extractors_stage_seconds histogram",
+    ]
+    for (extractor, stage), histogram in self.histograms.items():
+      labels = f'extractor="{extractor}",stage="{stage}"'
+      cumulative = 0
+      for bound, count in zip([*map(str, self.bounds), "+Inf"], histogram.buckets, strict=True):
+        cumulative += count
+        lines.append(f'extractors_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+      lines.append(f"extractors_stage_seconds_sum{{{labels}}} {histogram.sum}")
+      lines.append(f"extractors_stage_seconds_count{{{labels}}} {histogram.count}")
+    lines += [
+      "# HELP extractors_stage_items_total Items counted at extraction stages",
+      "# TYPE extractors_stage_items_total counter",
+    ]
+    for (extractor, stage), histogram in self.histograms.items():
+      for name, total in histogram.totals.items():
+        lines.append(f'extractors_stage_items_total{{extractor="{extractor}",stage="{stage}",item="{name}"}} {total}')
+    return "\n".join(lines) + "\n"
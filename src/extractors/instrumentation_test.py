@@ -0,0 +1,41 @@
+# mypy: disable-error-code=no-untyped-def
+import json
+from .instrumentation import HistogramSink, JsonlSink, PrometheusSink, StageEvent
+
+EVENTS = [
+  StageEvent("SkillExtractor", "match", 0.0002, {"pmatches": 2, "xmatches": 0}),
+  StageEvent("SkillExtractor", "match", 0.003, {"pmatches": 1, "xmatches": 1}),
+  StageEvent("SkillExtractor", "cancel", 0.5, {"canceled": 1}),
+]
+
+class Test_HistogramSink:
+  def test_smoke(self) -> None:
+    sink = HistogramSink(buckets=[0.001, 0.01])
+    for event in EVENTS:
+      sink.emit(event)
+    match = sink.histograms[("SkillExtractor", "match")]
+    assert match.buckets == [1, 1, 0] and match.count == 2
+    assert match.totals == {"pmatches": 3, "xmatches": 1}
+    assert sink.histograms[("SkillExtractor", "cancel")].buckets == [0, 0, 1]
+
+class Test_JsonlSink:
+  def test_smoke(self, tmp_path) -> None:
+    sink = JsonlSink(tmp_path / "events.jsonl")
+    for event in EVENTS:
+      sink.emit(event)
+    sink.close()
+    lines = (tmp_path / "events.jsonl").read_text().splitlines()
+    assert [StageEvent(**json.loads(line)) for line in lines] == EVENTS
+
+class Test_PrometheusSink:
+  def test_smoke(self, tmp_path) -> None:
+    sink = PrometheusSink(tmp_path / "extractors.prom", buckets=[0.001, 0.01])
+    for event in EVENTS:
+      sink.emit(event)
+    sink.dump()
+    lines = (tmp_path / "extractors.prom").read_text().splitlines()
+    assert 'extractors_stage_seconds_bucket{extractor="SkillExtractor",stage="match",le="0.01"} 2' in lines
+    assert 'extractors_stage_seconds_bucket{extractor="SkillExtractor",stage="cancel",le="+Inf"} 1' in lines
+    assert 'extractors_stage_seconds_count{extractor="SkillExtractor",stage="match"} 2' in lines
+    assert 'extractors_stage_items_total{extractor="SkillExtractor",stage="match",item="pmatches"} 3' in lines
+    assert [path.name for path in tmp_path.iterdir()] == ["extractors.prom"]
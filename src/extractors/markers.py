@@ -1,9 +1,9 @@
 import re
-from spacy.tokens import Token
-from typing import cast
+from spacy.tokens import Doc, Token
+from typing import cast, NamedTuple
+from weakref import WeakKeyDictionary
 from extractors.ppatterns import expand_parens
-from extractors.spacyhelpers import left_token
-from extractors.utils import revlist, revtakeuntil
+from extractors.spacyhelpers import doc_tree
 
 PAST_MARKERS = {
   "ex",
@@ -37,115 +37,168 @@ INTENT_MARKERS = set([
 ] + ["gonna be", "wanna be", "wannabe", "gonnabe"])
 
 def is_hashtagged(token: Token) -> bool:
-  j = cast(int, token._.i)
-  return j > 0 and token.sent[j - 1].lower_ == "#"
+  return token_markers(token).hashtagged
 
 def get_ancestors(token: Token) -> list[Token]:
-  tok = token
+  doc = token.doc
+  tree = doc_tree(doc)
+  heads, deps = tree.heads, tree.deps
+  stopdeps = {doc.vocab.strings["dep"], doc.vocab.strings["parataxis"]}
+  i = token.i
   toks: list[Token] = []
-  while tok != tok.head and tok.dep_ not in {"dep", "parataxis"}:
+  while heads[i] != i and deps[i] not in stopdeps:
     # TODO stop if there appears punctuation between both?!
-    tok = tok.head
-    toks.append(tok)
+    i = heads[i]
+    toks.append(doc[i])
   return toks
 
-# is_negated
 def is_negated(token: Token) -> bool:
-  # print("@ is_negated", token)
   # Note: Spacy makes mistakes with 'not' head as major as it does with other things @_@
-  chain = [token, *get_ancestors(token)]
-  return any(_is_negated(item) for item in chain)
-
-def _is_negated(token: Token) -> bool:
-  # print("@ _is_negated:", token)
-  non_chain = [*revlist(revtakeuntil(lambda tok: tok.text in {",", ";"}, token.lefts)), token]
-  for tok in non_chain:
-    if re.match(r"non[-.]?(?!\w)", tok.lower_):
-      return True
-  ## Hacks for Spacy invalid dep. parsing ##
-  lt1 = left_token(token)
-  lt2 = left_token(lt1)
-  if lt1 and re.match(r"non[-.]?(?!\w)", lt1.lower_):
-    return True
-  if lt2 and re.match(r"non[-.]?(?!\w)", lt2.lower_) and lt1 and lt1.text in {".", "-"}:
-    return True
-  ## ##
-  for tok in token.sent:
-    if tok.head == token and tok.dep_ == "neg":
-      # (not) < ($token) -- "not a developer"
-      # (non) < ($token) -- "non developer"
-      return True
-    elif tok.head.head == token and tok.head.dep_ == "compound" and tok.dep_ == "neg":
-      # (not) < ($) < ($token) -- "not job seeking"
-      return True
-  return False
+  return token_markers(token).negated
 
-# is_past
 def is_past(token: Token) -> bool:
-  # print("@ is_past", token)
-  chain = [token, *get_ancestors(token)]
-  return any(_is_past(item) for item in chain)
-
-def _is_past(token: Token) -> bool:
-  # print("@ _is_past", token)
-  ex_chain = [*revlist(revtakeuntil(lambda tok: tok.text in {",", ";"}, token.lefts)), token]
-  for tok in ex_chain:
-    if re.match(r"ex[-.]?(?!\w)", tok.lower_):
-      return True
-  ## Hacks for Spacy invalid dep. parsing ##
-  lt1 = left_token(token)
-  lt2 = left_token(lt1)
-  if lt1 and re.match(r"ex[-.]?(?!\w)", lt1.lower_):
-    return True
-  if lt2 and re.match(r"ex[-.]?(?!\w)", lt2.lower_) and lt1 and lt1.text in {".", "-"}:
-    return True
-  ## ##
-  if token.head.lower_ in {"was", "were"}:
-    # (was) > $token
-    return True
-  for tok in token.sent:
-    if tok.head == token and tok.lower_ in {"ex", "former", "formerly", "previous", "previously", "retired"}:
-      # (former) < ($token)
-      return True
-    elif tok.lower_ == "ago":
-      # (ago) < ($token) -- "developer, some time ago"
-      return True
-  return False
+  return token_markers(token).past
 
-# is_future
 def is_future(token: Token) -> bool:
-  # print("@ is_future", token)
-  chain = [token, *get_ancestors(token)]
-  return any(_is_future(item) for item in chain)
+  return token_markers(token).future
+
+# MARKER INDEX
+# Markers are found for all tokens of a sentence in a single pass, and cached per doc like trees.
+# The predicates above are lookups instead of sentence scans per ancestor.
+class TokenMarkers(NamedTuple):
+  """
+  Markers of a token. `negated`, `past` and `future` hold for the token
+  or one of its ancestors in `get_ancestors`.
+  """
+  hashtagged: bool
+  negated: bool
+  past: bool
+  future: bool
+
+_markers: WeakKeyDictionary[Doc, list[TokenMarkers | None]] = WeakKeyDictionary()
+
+def token_markers(token: Token) -> TokenMarkers:
+  doc = token.doc
+  markers = _markers.get(doc)
+  if markers is None:
+    markers = _markers[doc] = [None] * len(doc)
+  marks = markers[token.i]
+  if marks is None:
+    tree = doc_tree(doc)
+    start, end = tree.sent_starts[token.i], tree.sent_ends[token.i]
+    markers[start:end] = find_markers(doc, start, end)
+    marks = cast(TokenMarkers, markers[token.i])
+  return marks
+
+NON_RE = re.compile(r"non[-.]?(?!\w)")
+EX_RE = re.compile(r"ex[-.]?(?!\w)")
+
+def find_markers(doc: Doc, start: int, end: int) -> list[TokenMarkers]:
+  """
+  Markers of the tokens of the sentence `doc[start:end]`
+  """
+  tree = doc_tree(doc)
+  heads, deps, depths = tree.heads, tree.deps, tree.depths
+  strings = doc.vocab.strings
+  negdep, compounddep, depdep = strings["neg"], strings["compound"], strings["dep"]
+  stopdeps = {depdep, strings["parataxis"]}
+  span = doc[start:end]
+  lowers = {tok.i: tok.lower_ for tok in span}
+  texts = {tok.i: tok.text for tok in span}
+  nons = {i for i, lower in lowers.items() if NON_RE.match(lower)}
+  exes = {i for i, lower in lowers.items() if EX_RE.match(lower)}
+
+  negated: set[int] = set()
+  past: set[int] = set(range(start, end)) if "ago" in lowers.values() else set() # (ago) < ($token) -- "developer, some time ago"
+  futurelefts: set[int] = set() # tokens with a left child in `FUTURE_WORDS`
+  willlefts: set[int] = set()   # tokens with a left child in `WILL_WORDS`
+  cutlefts: set[int] = set()    # tokens whose left children were cut by "," or ";" (rightmost first)
+  for j in reversed(range(start, end)):
+    h = heads[j]
+    if j < h:
+      # (non) < ($token), (ex) < ($token) -- left children up to "," or ";"
+      if texts[j] in {",", ";"}:
+        cutlefts.add(h)
+      elif h not in cutlefts:
+        if j in nons:
+          negated.add(h)
+        if j in exes:
+          past.add(h)
+      if lowers[j] in FUTURE_WORDS:
+        futurelefts.add(h)
+      if lowers[j] in WILL_WORDS:
+        willlefts.add(h)
+    if deps[j] == negdep:
+      # (not) < ($token) -- "not a developer"
+      # (non) < ($token) -- "non developer"
+      negated.add(h)
+      if deps[h] == compounddep:
+        # (not) < ($) < ($token) -- "not job seeking"
+        negated.add(heads[h])
+    if lowers[j] in PAST_MARKERS:
+      # (former) < ($token)
+      past.add(h)
+
+  future: set[int] = set()
+  for i in range(start, end):
+    ## Hacks for Spacy invalid dep. parsing ##
+    if i - 1 >= start:
+      if i - 1 in nons or i - 2 >= start and i - 2 in nons and texts[i - 1] in {".", "-"}:
+        negated.add(i)
+      if i - 1 in exes or i - 2 >= start and i - 2 in exes and texts[i - 1] in {".", "-"}:
+        past.add(i)
+    ## ##
+    if i in nons:
+      negated.add(i)
+    if i in exes:
+      past.add(i)
+    h = heads[i]
+    if lowers[h] in {"was", "were"}:
+      # (was) > $token
+      past.add(i)
+    if is_future_marked(i, h, heads[h], deps[i] != depdep, lowers, willlefts, futurelefts):
+      future.add(i)
+
+  # A token is marked if an ancestor is (heads come first by depth)
+  chained: dict[int, tuple[bool, bool, bool]] = {}
+  for i in sorted(range(start, end), key=depths.__getitem__):
+    h = heads[i]
+    up = chained[h] if h != i and deps[i] not in stopdeps else (False, False, False)
+    chained[i] = (i in negated or up[0], i in past or up[1], i in future or up[2])
+  return [
+    TokenMarkers(i > start and lowers[i - 1] == "#", *chained[i])
+    for i in range(start, end)
+  ]
 
-def _is_future(token: Token) -> bool:
-  # print("@ _is_future", token)
-  if token.head.lower_ in {"wannabe"} and token.dep_ != "dep":
+def is_future_marked(
+  i: int, h: int, hh: int, notdep: bool, lowers: dict[int, str], willlefts: set[int], futurelefts: set[int]
+) -> bool:
+  """
+  Whether token `i` (with head `h` and grand head `hh`) is marked as future by itself
+  """
+  if lowers[h] in {"wannabe"} and notdep:
     # ($token) < (wannabe)
     return True
-  elif token.head.lower_ in OPPORTUNITY_WORDS and token.dep_ != "dep":
+  elif lowers[h] in OPPORTUNITY_WORDS and notdep:
     # ($token) < (opportunity)
     return True
-  elif token.head.lower_ in {"be", "become"} and token.dep_ != "dep":
+  elif lowers[h] in {"be", "become"} and notdep:
     # (be) > ($token)
-    if any(t.lower_ in WILL_WORDS for t in token.head.lefts):
+    if h in willlefts:
       # (will) < (be) > ($token)
       return True
-    elif token.head.head.lower_ in PLAN_WORDS:
+    elif lowers[hh] in PLAN_WORDS:
       # (plan) > (be) > ($token)
       return True
-  elif token.head.lower_ in SEARCH_WORDS and token.dep_ != "dep":
+  elif lowers[h] in SEARCH_WORDS and notdep:
     # (search) > ($token) -- "seeking an intership"
     return True
-  elif token.head.lower_ == "for" and token.head.head.lower_ in SEARCH_WORDS and token.dep_ != "dep":
+  elif lowers[h] == "for" and lowers[hh] in SEARCH_WORDS and notdep:
     # (search) > (for) > ($token) -- "looking for intership"
     return True
-  elif any(tok.lower_ in FUTURE_WORDS for tok in token.lefts):
+  elif i in futurelefts:
     # (future) < ($token)
     return True
-  elif any(tok.head == token and tok.lower_ in FUTURE_WORDS for tok in token.lefts):
-    # (future) < ($) < ($token) -- accounting for certain Spacy issues
-    return True
   return False
 
 # Lemmas are confusing and inconsistent, intentionally not using them
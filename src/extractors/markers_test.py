@@ -181,3 +181,13 @@ class Test_is_future:
     assert is_future(text, 9) # ?devops
     assert is_future(text, 8) # ?junior
     assert not is_future(text, 2) # ?student
+
+class Test_token_markers:
+  def test_per_sentence(self, nlp: Language) -> None:
+    doc = nlp(fix_grammar(normalize("Not a developer. Ex designer, #freelancer")))
+    marks = markers.token_markers(doc[2])
+    assert marks.negated and not marks.past
+    sent2 = list(doc.sents)[1]
+    assert markers._markers[doc][sent2.start] is None # sentences are indexed on demand
+    assert markers.token_markers(doc[2]) is marks
+    assert [markers.token_markers(tok).hashtagged for tok in sent2] == [tok.i > sent2.start and doc[tok.i - 1].text == "#" for tok in sent2]
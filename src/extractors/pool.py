@@ -0,0 +1,271 @@
+"""
+Batch extraction on several processes. Every worker loads the model and an extractor once,
+texts are sent in chunks and results come back in input order.
+
+with ExtractorPool(ExtractorSpec("title", kwargs={"tagfilter": "Human"}), processes=32) as pool:
+  titles = pool.map(texts)
+
+Workers forked after `prefork()` share the model and the extractors loaded in the parent:
+
+prefork()
+with ExtractorPool(ExtractorSpec("skills"), start_method="fork") as pool:
+  skills = pool.map(texts)
+  print(format_memory(pool.memory()))
+"""
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from itertools import batched
+import gc
+import logging
+import multiprocessing
+import os
+from spacy import Language
+from typing import Any, NamedTuple, Self
+from .categories.data import TAGS as CATEGORY_TAGS
+from .categories.extractor import CategoryExtractor
+from .experience.data import TAGS as EXPERIENCE_TAGS
+from .experience.extractor import ExperienceExtractor
+from .extractor import BaseExtractor
+from .skills.data import SKILLS
+from .skills.extractor import SkillExtractor
+from .title.data import TAGS as TITLE_TAGS
+from .title.extractor import TitleExtractor
+from .utils import get_nlp
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class ExtractorSpec:
+  """
+  What a worker builds: an extractor by name (see `build_extractor`) over a model,
+  and the extra arguments of its `extract_many` (e.g. `{"tagfilter": "Human"}` for titles)
+  """
+  name: str
+  model: str = "en_core_web_lg"
+  kwargs: dict[str, Any] = field(default_factory=dict)
+
+def build_extractor(nlp: Language, name: str) -> BaseExtractor:
+  match name:
+    case "skills": return SkillExtractor(nlp, SKILLS)
+    case "categories": return CategoryExtractor(nlp, CATEGORY_TAGS)
+    case "title": return TitleExtractor(nlp, TITLE_TAGS)
+    case "experience": return ExperienceExtractor(nlp, EXPERIENCE_TAGS)
+  raise ValueError(f"unknown extractor {name!r}")
+
+# WORKERS
+# Models and extractors of a worker process. Loaded before the pool is created (see `prefork`),
+# they're inherited by forked workers.
+_nlps: dict[str, Language] = {}                # model -> nlp
+_extractors: dict[tuple[str, str], Any] = {}   # (model, name) -> extractor
+
+def worker_extractor(spec: ExtractorSpec) -> Any:
+  extractor = _extractors.get((spec.model, spec.name))
+  if extractor is None:
+    nlp = _nlps.get(spec.model)
+    if nlp is None:
+      nlp = _nlps[spec.model] = get_nlp(spec.model)
+    extractor = _extractors[spec.model, spec.name] = build_extractor(nlp, spec.name)
+  return extractor
+
+def init_worker(spec: ExtractorSpec) -> None:
+  worker_extractor(spec)
+
+def extract_chunk(spec: ExtractorSpec, texts: list[str]) -> list[Any]:
+  results: list[Any] = worker_extractor(spec).extract_many(texts, **spec.kwargs)
+  return results
+
+EXTRACTOR_NAMES = ("skills", "categories", "title", "experience")
+
+WARMUP_TEXTS = [
+  "Senior PHP developer at Google, ex Java engineer. 5+ years of experience.",
+  "Freelance data scientist: Python, PyTorch, AWS. Open to remote work #hireable",
+  "CS student looking for an internship | Founder @Startup",
+]
+
+def prefork(names: Iterable[str] = EXTRACTOR_NAMES, model: str = "en_core_web_lg", warmup: Sequence[str] = WARMUP_TEXTS) -> None:
+  """
+  Load a model and extractors for workers forked from this process (`start_method="fork"`) to share them.
+  The GC is off while loading and warming up (no holes in memory pages), then the heap is frozen:
+  collections in workers don't write to the pages of the loaded objects, so they stay shared (copy-on-write).
+  Refcount updates still copy the pages of the objects a worker touches.
+  """
+  enabled = gc.isenabled()
+  gc.disable()
+  try:
+    for name in names:
+      extractor: BaseExtractor = worker_extractor(ExtractorSpec(name, model))
+      for doc in extractor.nlp.pipe(warmup):
+        extractor.find_uarrays(doc) # lexemes and lazy matcher structures are created before the fork
+  finally:
+    gc.freeze()
+    if enabled:
+      gc.enable()
+
+class MemoryUsage(NamedTuple):
+  pid: int
+  rss: int # resident bytes, including shared pages
+  pss: int # resident bytes, shared pages divided between the processes sharing them
+  uss: int # bytes private to the process
+
+def memory_usage(pids: Iterable[int]) -> list[MemoryUsage]:
+  """
+  Memory of processes (requires `psutil`, a dev dependency)
+  """
+  import psutil # type: ignore[import-untyped]
+  usages: list[MemoryUsage] = []
+  for pid in pids:
+    info = psutil.Process(pid).memory_full_info()
+    usages.append(MemoryUsage(pid, info.rss, getattr(info, "pss", 0), info.uss))
+  return usages
+
+def format_memory(usages: Sequence[MemoryUsage]) -> str:
+  mb = 1024 * 1024
+  lines = [f"{'pid':>8} {'rss MB':>8} {'pss MB':>8} {'uss MB':>8}"]
+  for usage in usages:
+    lines.append(f"{usage.pid:>8} {usage.rss / mb:>8.1f} {usage.pss / mb:>8.1f} {usage.uss / mb:>8.1f}")
+  return "\n".join(lines)
+
+# POOL
+class WorkerCrashError(RuntimeError):
+  """
+  A text crashes a worker (e.g. it's killed for memory) even when it's extracted alone
+  """
+  def __init__(self, index: int, text: str):
+    super().__init__(f"text #{index} crashes workers: {text[:80]!r}")
+    self.index = index
+    self.text = text
+
+@dataclass
+class Chunk:
+  start: int          # index of the first text in the input
+  texts: list[str]
+  suspect: bool = False # was in flight when a worker crashed, so it runs alone
+  failures: int = 0     # crashes while running alone
+
+class ExtractorPool:
+  """
+  Process pool running one extractor. A chunk which was in flight when a worker crashed is re-run alone
+  (the pool is restarted), so the crashing chunk is found. A chunk crashing alone more than `retries` times
+  is split in halves, down to the crashing text, which raises `WorkerCrashError`. Other chunks aren't lost.
+  """
+
+  def __init__(
+    self, spec: ExtractorSpec, processes: int | None = None, batch_size: int = 64,
+    retries: int = 1, start_method: str | None = None,
+  ):
+    self.spec = spec
+    self.processes = processes or os.cpu_count() or 1
+    self.batch_size = batch_size
+    self.retries = retries
+    self.context = multiprocessing.get_context(start_method)
+    self.executor: ProcessPoolExecutor | None = None
+    self.crashes = 0 # worker crashes (pool restarts)
+
+  def __enter__(self) -> Self:
+    return self
+
+  def __exit__(self, *args: object) -> None:
+    self.close()
+
+  def close(self) -> None:
+    if self.executor is not None:
+      self.executor.shutdown()
+      self.executor = None
+
+  def start(self) -> ProcessPoolExecutor:
+    if self.executor is None:
+      self.executor = ProcessPoolExecutor(
+        max_workers=self.processes, mp_context=self.context, initializer=init_worker, initargs=(self.spec,),
+      )
+    return self.executor
+
+  def memory(self) -> list[MemoryUsage]:
+    """
+    Memory of the pool's workers (started on the first chunk)
+    """
+    return memory_usage(self.executor._processes if self.executor else [])
+
+  def map(self, texts: Iterable[str]) -> list[Any]:
+    return list(self.imap(texts))
+
+  def imap(self, texts: Iterable[str]) -> Iterator[Any]:
+    """
+    Extract texts, read in chunks as workers get free, yielding results in input order
+    """
+    chunks = (Chunk(k * self.batch_size, list(batch)) for k, batch in enumerate(batched(texts, self.batch_size)))
+    retry: list[Chunk] = []                       # chunks to re-run, by start
+    inflight: dict[Future[list[Any]], Chunk] = {}
+    done: dict[int, list[Any]] = {}               # chunk start -> results
+    cursor = 0                                    # index of the next result to yield
+    while True:
+      self.submit(chunks, retry, inflight)
+      if not inflight:
+        break
+      completed, _ = wait(inflight, return_when=FIRST_COMPLETED)
+      crashed = False
+      for future in completed:
+        if isinstance(future.exception(), BrokenProcessPool):
+          crashed = True
+        else:
+          done[inflight.pop(future).start] = future.result() # raises errors of the extractor
+      if crashed:
+        self.recover(inflight, done, retry)
+      while cursor in done:
+        results = done.pop(cursor)
+        cursor += len(results)
+        yield from results
+
+  def submit(self, chunks: Iterator[Chunk], retry: list[Chunk], inflight: dict[Future[list[Any]], Chunk]) -> None:
+    """
+    Fill the pool: chunks to re-run first, suspects alone
+    """
+    while len(inflight) < 2 * self.processes and not any(chunk.suspect for chunk in inflight.values()):
+      if retry:
+        if retry[0].suspect and inflight:
+          return
+        chunk = retry.pop(0)
+      else:
+        next_chunk = next(chunks, None)
+        if next_chunk is None:
+          return
+        chunk = next_chunk
+      inflight[self.start().submit(extract_chunk, self.spec, chunk.texts)] = chunk
+
+  def recover(self, inflight: dict[Future[list[Any]], Chunk], done: dict[int, list[Any]], retry: list[Chunk]) -> None:
+    """
+    Restart the pool after a worker crash, keeping the results of finished chunks and queueing the others
+    """
+    self.crashes += 1
+    assert self.executor is not None
+    self.executor.shutdown(cancel_futures=True)
+    self.executor = None
+    for future, chunk in inflight.items():
+      if future.done() and not future.cancelled() and future.exception() is None:
+        done[chunk.start] = future.result()
+      elif not chunk.suspect:
+        chunk.suspect = True
+        retry.append(chunk)
+      else: # crashed alone
+        chunk.failures += 1
+        logger.warning("chunk of %d texts at #%d crashed a worker (%d times)", len(chunk.texts), chunk.start, chunk.failures)
+        if chunk.failures <= self.retries:
+          retry.append(chunk)
+        elif len(chunk.texts) > 1:
+          half = len(chunk.texts) // 2
+          retry += [
+            Chunk(chunk.start, chunk.texts[:half], True, self.retries),
+            Chunk(chunk.start + half, chunk.texts[half:], True, self.retries),
+          ]
+        else:
+          raise WorkerCrashError(chunk.start, chunk.texts[0])
+    inflight.clear()
+    retry.sort(key=lambda chunk: chunk.start)
+
+def extract_many(spec: ExtractorSpec, texts: Sequence[str], processes: int | None = None, batch_size: int = 64) -> list[Any]:
+  """
+  Extract texts on a pool of `processes` (all cores by default), started and closed for the call
+  """
+  with ExtractorPool(spec, processes, batch_size) as pool:
+    return pool.map(texts)
@@ -0,0 +1,77 @@
+# mypy: disable-error-code=no-untyped-def
+import gc
+from pathlib import Path
+import os
+import pytest
+from spacy import Language
+from . import pool
+from .pool import ExtractorPool, ExtractorSpec, WorkerCrashError, prefork
+from .skills.data import SKILLS
+from .skills.extractor import SkillExtractor
+from .utils import fix_grammar, normalize
+
+class UpperExtractor:
+  """
+  Stands for an extractor in forked workers: exits the worker on "crash" (only once if `flag` is given)
+  """
+  def __init__(self, flag: Path | None = None):
+    self.flag = flag
+
+  def extract_many(self, texts: list[str]) -> list[str]:
+    if "crash" in texts:
+      if self.flag is None:
+        os._exit(1)
+      elif not self.flag.exists():
+        self.flag.touch()
+        os._exit(1)
+    return [text.upper() for text in texts]
+
+class Test_ExtractorPool:
+  def test_same_as_serial(self, nlp: Language) -> None:
+    texts = [fix_grammar(normalize(text)) for text in [
+      "Senior PHP developer at Google",
+      "Python, Django and PostgreSQL",
+      "I'm a freelance manager",
+      "React Native and Kotlin mobile dev",
+      "",
+    ]]
+    with ExtractorPool(ExtractorSpec("skills"), processes=2, batch_size=2) as p:
+      assert p.map(texts) == SkillExtractor(nlp, SKILLS).extract_many(texts)
+
+  def test_crash_recovery(self, monkeypatch, tmp_path: Path) -> None:
+    spec = ExtractorSpec("upper")
+    monkeypatch.setitem(pool._extractors, (spec.model, spec.name), UpperExtractor(tmp_path / "crashed"))
+    texts = [f"text {i}" for i in range(20)]
+    texts[7] = "crash"
+    with ExtractorPool(spec, processes=2, batch_size=3, start_method="fork") as p:
+      assert p.map(texts) == [text.upper() for text in texts]
+      assert p.crashes == 1
+
+  def test_crashing_text(self, monkeypatch) -> None:
+    spec = ExtractorSpec("upper")
+    monkeypatch.setitem(pool._extractors, (spec.model, spec.name), UpperExtractor())
+    texts = [f"text {i}" for i in range(20)]
+    texts[7] = "crash"
+    with ExtractorPool(spec, processes=2, batch_size=4, start_method="fork") as p:
+      results = p.imap(texts)
+      assert [next(results) for _ in range(4)] == [text.upper() for text in texts[:4]]
+      with pytest.raises(WorkerCrashError) as error:
+        list(results)
+      assert error.value.index == 7
+
+class Test_prefork:
+  def test_forked_workers(self, nlp: Language, monkeypatch) -> None:
+    monkeypatch.setitem(pool._nlps, "en_core_web_lg", nlp)
+    monkeypatch.setattr(pool, "_extractors", {})
+    try:
+      prefork(["skills"])
+      assert gc.get_freeze_count() > 0
+      assert list(pool._extractors) == [("en_core_web_lg", "skills")]
+      texts = ["Python and Django developer", "React Native engineer"]
+      with ExtractorPool(ExtractorSpec("skills"), processes=2, batch_size=1, start_method="fork") as p:
+        assert p.map(texts) == pool._extractors["en_core_web_lg", "skills"].extract_many(texts)
+        usages = p.memory()
+        assert len(usages) == 2
+        assert all(0 < usage.uss <= usage.rss for usage in usages)
+    finally:
+      gc.unfreeze()
@@ -0,0 +1,176 @@
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass
+from spacy.matcher import DependencyMatcher, Matcher
+from spacy.strings import StringStore
+from spacy.tokens import Doc
+from spacy.vocab import Vocab
+from typing import Any
+from .dpatterns import DPattern, RIGHT_ATTRS
+from .xpatterns import IN, LOWER, OP, ORTH, TEXT, XPattern, XToken
+
+# Anchors are literal lowers (as ids) a doc must contain for a pattern to match.
+# Checking them against the doc's lowers is way cheaper than running matchers on a doc that can't match.
+
+type Anchor = frozenset[int]
+
+@dataclass
+class PrefilterStats:
+  docs: int = 0           # docs checked
+  skipped_docs: int = 0   # docs where no `Matcher` or `DependencyMatcher` group could match
+  groups: int = 0         # pattern groups checked
+  skipped_groups: int = 0 # pattern groups skipped
+
+def doc_lowers(doc: Doc) -> set[int]:
+  return {token.lower for token in doc}
+
+def token_anchor(strings: StringStore, xtoken: XToken) -> Anchor | None:
+  """
+  Lowers of which a token must have one, `None` if the token is not constrained by them
+  """
+  words: set[str] | None = None
+  for attr in [LOWER, ORTH, TEXT]:
+    value = xtoken.get(attr)
+    if isinstance(value, dict):
+      value = value.get(IN)
+    if isinstance(value, str):
+      value = [value]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+      lowers = {v.lower() for v in value}
+      words = lowers if words is None else words & lowers
+  if words is None:
+    return None
+  return frozenset(strings.add(word) for word in words)
+
+def is_required(xtoken: XToken) -> bool:
+  op = xtoken.get(OP)
+  return op is None or op == "+" or op.startswith("{") and not op.startswith(("{0", "{,"))
+
+def pattern_anchor(strings: StringStore, xtokens: Iterable[XToken]) -> Anchor | None:
+  """
+  The narrowest anchor of the required tokens, `None` if the pattern has no anchors
+  """
+  anchors = [anchor for xtoken in xtokens if is_required(xtoken) if (anchor := token_anchor(strings, xtoken)) is not None]
+  return min(anchors, key=len, default=None)
+
+def xpattern_anchor(strings: StringStore, xpattern: XPattern) -> Anchor | None:
+  return pattern_anchor(strings, xpattern)
+
+def dpattern_anchor(strings: StringStore, dpattern: DPattern) -> Anchor | None:
+  return pattern_anchor(strings, (dtoken.get(RIGHT_ATTRS, {}) for dtoken in dpattern)) # all nodes are required
+
+class AnchoredMatcher(Matcher):
+  """
+  `Matcher` which knows whether it can match a doc. Its matches are interleaved by token
+  positions, so patterns aren't split into groups: the whole matcher is skipped or run.
+  """
+
+  def __init__(self, vocab: Vocab, validate: bool = True):
+    super().__init__(vocab, validate=validate)
+    self.strings = vocab.strings
+    self.anchors: Counter[int] = Counter() # lower -> number of patterns anchored by it
+    self.unanchored = 0                    # number of patterns without anchors
+
+  def add(self, key: str, patterns: list[XPattern], **kwargs: Any) -> None: # type: ignore[override]
+    super().add(key, patterns, **kwargs)
+    for xpattern in patterns:
+      anchor = xpattern_anchor(self.strings, xpattern)
+      if anchor is None:
+        self.unanchored += 1
+      else:
+        self.anchors.update(anchor)
+
+  def remove(self, key: str) -> None:
+    patterns = self.get(key)[1]
+    super().remove(key)
+    for xpattern in patterns:
+      anchor = xpattern_anchor(self.strings, xpattern)
+      if anchor is None:
+        self.unanchored -= 1
+      else:
+        self.anchors.subtract(anchor)
+        for lower in anchor:
+          if not self.anchors[lower]:
+            del self.anchors[lower]
+
+  def can_match(self, lowers: set[int]) -> bool:
+    return bool(self.unanchored) or not self.anchors.keys().isdisjoint(lowers)
+
+class AnchoredDependencyMatcher:
+  """
+  `DependencyMatcher` split into groups of patterns sharing an anchor, to run only the groups
+  which can match a doc. Every pattern gets its own key in a group, so matches are put back
+  in the order of a single `DependencyMatcher` (by keys, then patterns in a key).
+  """
+
+  def __init__(self, vocab: Vocab):
+    self.vocab = vocab
+    self.patterns: dict[str, list[DPattern]] = {}
+    self.keypositions: dict[str, int] = {}
+    self.nextposition = 0 # positions of removed keys aren't reused, so re-added keys go last
+    self.groups: dict[Anchor | None, DependencyMatcher] = {}
+    self.index: dict[int, list[DependencyMatcher]] = {} # lower -> groups anchored by it
+    self.origins: dict[int, tuple[int, int, int]] = {}  # group key -> (key, its position, pattern position)
+
+  def __len__(self) -> int:
+    return len(self.patterns)
+
+  def __contains__(self, key: str) -> bool:
+    return key in self.patterns
+
+  def get(self, key: str) -> tuple[None, list[DPattern]]:
+    return None, self.patterns[key]
+
+  def add(self, key: str, patterns: list[DPattern]) -> None:
+    keypatterns = self.patterns.setdefault(key, [])
+    if key not in self.keypositions:
+      self.keypositions[key] = self.nextposition
+      self.nextposition += 1
+    keypos = self.keypositions[key]
+    key_id = self.vocab.strings.add(key)
+    for dpattern in patterns:
+      anchor = dpattern_anchor(self.vocab.strings, dpattern)
+      if anchor not in self.groups:
+        self.groups[anchor] = group = DependencyMatcher(self.vocab)
+        for lower in anchor or []:
+          self.index.setdefault(lower, []).append(group)
+      gkey = f"{key}#{len(keypatterns)}"
+      self.origins[self.vocab.strings.add(gkey)] = (key_id, keypos, len(keypatterns))
+      self.groups[anchor].add(gkey, [dpattern])
+      keypatterns.append(dpattern)
+
+  def remove(self, key: str) -> None:
+    for p, dpattern in enumerate(self.patterns.pop(key)):
+      anchor = dpattern_anchor(self.vocab.strings, dpattern)
+      gkey = f"{key}#{p}"
+      group = self.groups[anchor]
+      group.remove(gkey)
+      del self.origins[self.vocab.strings[gkey]]
+      if not len(group):
+        del self.groups[anchor]
+        for lower in anchor or []:
+          self.index[lower] = [g for g in self.index[lower] if g is not group]
+          if not self.index[lower]:
+            del self.index[lower]
+    del self.keypositions[key]
+
+  def groups_for(self, lowers: set[int]) -> list[DependencyMatcher]:
+    """
+    Groups which can match a doc with `lowers`
+    """
+    groups = {id(group): group for lower in lowers for group in self.index.get(lower, [])}
+    if None in self.groups:
+      groups[id(self.groups[None])] = self.groups[None]
+    return list(groups.values())
+
+  def match_groups(self, doc: Doc, groups: list[DependencyMatcher]) -> list[tuple[int, list[int]]]:
+    matches: list[tuple[tuple[int, int], tuple[int, list[int]]]] = []
+    for group in groups:
+      for gkey, offsets in group(doc):
+        key_id, keypos, patternpos = self.origins[gkey]
+        matches.append(((keypos, patternpos), (key_id, offsets)))
+    matches.sort(key=lambda m: m[0]) # stable: the matches of a pattern come from a single group
+    return [match for _, match in matches]
+
+  def __call__(self, doc: Doc) -> list[tuple[int, list[int]]]:
+    return self.match_groups(doc, self.groups_for(doc_lowers(doc)))
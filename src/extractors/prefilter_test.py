@@ -0,0 +1,98 @@
+# mypy: disable-error-code=no-untyped-def
+import pytest
+import spacy
+from spacy.matcher import DependencyMatcher
+from spacy.tokens import Doc
+from .dpatterns import exp_ancestor, exp_dash, exp_parent, exp_sequence
+from .prefilter import AnchoredDependencyMatcher, AnchoredMatcher, doc_lowers, pattern_anchor, token_anchor
+
+@pytest.fixture(scope="module")
+def vocab():
+  return spacy.blank("en").vocab
+
+def words(vocab, anchor) -> set[str] | None:
+  return None if anchor is None else {vocab.strings[lower] for lower in anchor}
+
+class Test_anchors:
+  def test_token_anchor(self, vocab) -> None:
+    assert words(vocab, token_anchor(vocab.strings, {"LOWER": "python"})) == {"python"}
+    assert words(vocab, token_anchor(vocab.strings, {"ORTH": "Go", "POS": "PROPN"})) == {"go"}
+    assert words(vocab, token_anchor(vocab.strings, {"LOWER": {"IN": ["/", "and"]}})) == {"/", "and"}
+    assert token_anchor(vocab.strings, {"LOWER": {"REGEX": "^qt[-\\d.]{0,4}$"}}) is None
+    assert token_anchor(vocab.strings, {"POS": "NOUN"}) is None
+
+  def test_pattern_anchor(self, vocab) -> None:
+    assert words(vocab, pattern_anchor(vocab.strings, [
+      {"LOWER": {"IN": ["senior", "sr"]}}, {"LOWER": "developer"}
+    ])) == {"developer"}
+    assert words(vocab, pattern_anchor(vocab.strings, [
+      {"LOWER": "numba"}, {"OP": "!", "LOWER": "one"}
+    ])) == {"numba"}
+    assert pattern_anchor(vocab.strings, [{"LOWER": "ms", "OP": "?"}, {"POS": "PROPN"}]) is None
+
+class Test_AnchoredMatcher:
+  def test_can_match(self, vocab) -> None:
+    matcher = AnchoredMatcher(vocab)
+    matcher.add("Numba", [[{"LOWER": "numba"}, {"OP": "!", "LOWER": "one"}]])
+    assert matcher.can_match(doc_lowers(Doc(vocab, words=["Numba", "rocks"])))
+    assert not matcher.can_match(doc_lowers(Doc(vocab, words=["Python", "rocks"])))
+    matcher.add("Name", [[{"POS": "PROPN"}]])
+    assert matcher.can_match(doc_lowers(Doc(vocab, words=["Python", "rocks"])))
+
+  def test_remove(self, vocab) -> None:
+    matcher = AnchoredMatcher(vocab)
+    matcher.add("Numba", [[{"LOWER": "numba"}]])
+    matcher.add("Name", [[{"POS": "PROPN"}]])
+    matcher.remove("Name")
+    assert not matcher.can_match(doc_lowers(Doc(vocab, words=["Python", "rocks"])))
+    matcher.remove("Numba")
+    assert not matcher.can_match(doc_lowers(Doc(vocab, words=["Numba", "rocks"])))
+    assert len(matcher) == 0 and not matcher.anchors
+
+DPATTERNS = {
+  "Dev": [exp_parent("web", "developer"), exp_ancestor("senior", "developer")],
+  "Web": [exp_sequence("web", "dev"), exp_dash("web", "dev")],
+  "Noun": [[{"RIGHT_ID": "noun", "RIGHT_ATTRS": {"POS": "NOUN"}}]],
+}
+
+class Test_AnchoredDependencyMatcher:
+  @pytest.fixture(scope="class")
+  def docs(self, vocab):
+    return [
+      Doc(vocab, words=["senior", "web", "developer"], heads=[2, 2, 2], deps=["amod", "compound", "ROOT"], pos=["ADJ", "NOUN", "NOUN"]),
+      Doc(vocab, words=["web", "-", "dev", "web", "dev"], heads=[2, 2, 2, 4, 2], deps=["compound", "punct", "ROOT", "compound", "conj"], pos=["NOUN", "PUNCT", "NOUN", "NOUN", "NOUN"]),
+      Doc(vocab, words=["hello", "world"], heads=[0, 0], deps=["ROOT", "npadvmod"], pos=["INTJ", "NOUN"]),
+    ]
+
+  def test_same_as_dependency_matcher(self, vocab, docs) -> None:
+    matcher = DependencyMatcher(vocab)
+    amatcher = AnchoredDependencyMatcher(vocab)
+    for key, patterns in DPATTERNS.items():
+      matcher.add(key, patterns)
+      amatcher.add(key, patterns)
+    for doc in docs:
+      assert amatcher(doc) == matcher(doc)
+    assert len(amatcher) == 3 and "Web" in amatcher and amatcher.get("Web")[1] == DPATTERNS["Web"]
+
+  def test_groups_for(self, vocab, docs) -> None:
+    amatcher = AnchoredDependencyMatcher(vocab)
+    amatcher.add("Dev", DPATTERNS["Dev"])
+    assert len(amatcher.groups) == 2 # by "web" and "developer"
+    assert len(amatcher.groups_for(doc_lowers(docs[0]))) == 2
+    assert len(amatcher.groups_for(doc_lowers(docs[1]))) == 1
+    assert amatcher.groups_for(doc_lowers(docs[2])) == []
+
+  def test_remove(self, vocab, docs) -> None:
+    matcher = DependencyMatcher(vocab)
+    amatcher = AnchoredDependencyMatcher(vocab)
+    for key, patterns in DPATTERNS.items():
+      amatcher.add(key, patterns)
+    amatcher.remove("Dev")
+    amatcher.add("Dev", DPATTERNS["Dev"]) # goes last now
+    for key in ["Web", "Noun", "Dev"]:
+      matcher.add(key, DPATTERNS[key])
+    for doc in docs:
+      assert amatcher(doc) == matcher(doc)
+    amatcher.remove("Noun")
+    amatcher.remove("Dev")
+    assert len(amatcher) == 1 and len(amatcher.groups) == 1 and set(amatcher.index) == {vocab.strings["web"]}
@@ -0,0 +1,101 @@
+"""
+Find costly matcher patterns: run the patterns of every phrase alone over a corpus
+and rank phrases by matcher time, with their match yield.
+
+$ python -m extractors.profiler texts.txt [skills|categories|title|experience] [top]
+"""
+from collections.abc import Iterable, Sequence
+import json
+import re
+import sys
+from time import perf_counter
+from spacy import Language
+from spacy.tokens import Doc
+from typing import NamedTuple, cast
+from .categories.data import TAGS as CATEGORY_TAGS
+from .dpatterns import DPattern
+from .experience.data import TAGS as EXPERIENCE_TAGS
+from .extractor import BaseExtractor, MatcherTimings, Tag, phrase_kind, phrase_patterns, run_matchers
+from .skills.data import SKILLS
+from .spacyhelpers import REL_OP
+from .title.data import TAGS as TITLE_TAGS
+from .utils import fix_grammar, get_nlp, normalize
+from .xpatterns import XPattern
+
+class PhraseCost(NamedTuple):
+  tag: str       # tagname
+  phrase: str    # source phrase (XPattern and DPattern as JSON)
+  operator: str  # dependency operations ("<", "<~", ">>", " ", REL_OPs of dpatterns), "phrase" for pphrases, "" otherwise
+  patterns: int  # patterns loaded for the phrase
+  seconds: float # matcher time over the corpus
+  matches: int   # raw matches over the corpus
+
+def phrase_operator(phrase: str | XPattern | DPattern) -> str:
+  """
+  What a phrase's cost is attributed to: its dependency operation(s), or its kind for phrase matcher patterns
+  """
+  match phrase_kind(phrase):
+    case "dphrase":
+      m = re.search(r">>|<~|<", cast(str, phrase))
+      return m.group() if m else " "
+    case "dpattern":
+      return ",".join(dict.fromkeys(node[REL_OP] for node in cast(DPattern, phrase) if REL_OP in node))
+    case "pphrase":
+      return "phrase"
+  return ""
+
+def profile_phrases(nlp: Language, tags: Sequence[Tag], docs: Iterable[Doc]) -> list[PhraseCost]:
+  """
+  Run the patterns of every phrase alone over docs (prefiltered, as in extraction),
+  costly phrases first. Slow: a matcher set is built and run per phrase.
+  """
+  docs = list(docs)
+  costs: list[PhraseCost] = []
+  for tag in tags:
+    for phrase in tag.phrases:
+      ex = BaseExtractor(nlp, [Tag(tag.name, [phrase], tag.descr, tag.exclusive, None)])
+      timings = MatcherTimings()
+      matches = 0
+      for doc in docs:
+        pmatches, xmatches, dmatches = run_matchers(doc, ex.pmatcher, ex.xmatcher, ex.dmatcher, ex.prefilter, timings)
+        matches += len(pmatches) + len(xmatches) + len(dmatches)
+      costs.append(PhraseCost(
+        tag = tag.name,
+        phrase = phrase if isinstance(phrase, str) else json.dumps(phrase),
+        operator = phrase_operator(phrase),
+        patterns = pattern_count(ex),
+        seconds = timings.total,
+        matches = matches,
+      ))
+  costs.sort(key=lambda cost: cost.seconds, reverse=True)
+  return costs
+
+def pattern_count(ex: BaseExtractor) -> int:
+  return (
+    sum(len(texts) for texts in phrase_patterns(ex.pmatcher).values()) +
+    sum(counts.unique for counts in ex.patterncounts.values())
+  )
+
+def format_costs(costs: Sequence[PhraseCost], top: int | None = None) -> str:
+  total = sum(cost.seconds for cost in costs) or 1.0
+  lines = [f"{'ms':>9} {'share':>6} {'matches':>8} {'patterns':>8} {'op':>6}  tag: phrase"]
+  for cost in costs[:top]:
+    lines.append(
+      f"{cost.seconds * 1000:>9.2f} {cost.seconds / total:>6.1%} {cost.matches:>8} {cost.patterns:>8}"
+      f" {cost.operator or '-':>6}  {cost.tag}: {cost.phrase}"
+    )
+  return "\n".join(lines)
+
+def main() -> None:
+  path, name, top = sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "skills", int(sys.argv[3]) if len(sys.argv) > 3 else 50
+  tagsets: dict[str, Sequence[Tag]] = {"skills": SKILLS, "categories": CATEGORY_TAGS, "title": TITLE_TAGS, "experience": EXPERIENCE_TAGS}
+  nlp = get_nlp("en_core_web_lg")
+  with open(path) as file:
+    texts = [fix_grammar(normalize(line)) for line in file if line.strip()]
+  t0 = perf_counter()
+  costs = profile_phrases(nlp, tagsets[name], nlp.pipe(texts))
+  print(format_costs(costs, top))
+  print(f"\n{len(costs)} phrases over {len(texts)} docs, profiled in {perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+  main()
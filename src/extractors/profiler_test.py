@@ -0,0 +1,47 @@
+# mypy: disable-error-code=no-untyped-def
+from spacy import Language
+from .extractor import MatcherTimings
+from .profiler import PhraseCost, format_costs, phrase_operator, profile_phrases
+from .skills.extractor import SkillExtractor
+from .skills.tag import Tech
+
+class Test_phrase_operator:
+  def test_smoke(self) -> None:
+    assert phrase_operator("web<dev") == "<"
+    assert phrase_operator("web<~dev") == "<~"
+    assert phrase_operator("dev(s)>>job") == ">>"
+    assert phrase_operator("web dev") == "phrase"
+    assert phrase_operator("aws") == "phrase"
+    assert phrase_operator("AWS") == ""
+    assert phrase_operator([{"LOWER": "go"}]) == ""
+    assert phrase_operator([
+      {"RIGHT_ID": "dev", "RIGHT_ATTRS": {"LOWER": "dev"}},
+      {"LEFT_ID": "dev", "REL_OP": ">", "RIGHT_ID": "web", "RIGHT_ATTRS": {"LOWER": "web"}},
+    ]) == ">"
+
+class Test_format_costs:
+  def test_smoke(self) -> None:
+    costs = [PhraseCost("Web", "web<~dev", "<~", 9, 0.003, 2), PhraseCost("Go", "golang", "", 1, 0.001, 0)]
+    lines = format_costs(costs, top=1).splitlines()
+    assert len(lines) == 2
+    assert lines[1].split() == ["3.00", "75.0%", "2", "9", "<~", "Web:", "web<~dev"]
+
+class Test_profile_phrases:
+  def test_smoke(self, nlp: Language) -> None:
+    docs = list(nlp.pipe(["Senior web dev", "Golang dev"]))
+    costs = profile_phrases(nlp, [Tech("Web", ["web<~dev", "web dev"]), Tech("Go", ["golang"])], docs)
+    assert sorted((cost.tag, cost.phrase, cost.operator, cost.patterns) for cost in costs) == [
+      ("Go", "golang", "phrase", 1),
+      ("Web", "web dev", "phrase", 1),
+      ("Web", "web<~dev", "<~", 9),
+    ]
+    assert {cost.phrase: cost.matches for cost in costs if cost.operator != "<~"} == {"golang": 1, "web dev": 1}
+    assert costs == sorted(costs, key=lambda cost: cost.seconds, reverse=True)
+
+class Test_matchertimings:
+  def test_per_doc(self, nlp: Language) -> None:
+    ex = SkillExtractor(nlp, [Tech("Web", ["web<~dev"]), Tech("Go", ["golang"])])
+    ex.matchertimings = MatcherTimings()
+    ex.extract_many(["Senior web developer", "Golang dev"])
+    assert ex.matchertimings.docs == 2
+    assert ex.matchertimings.dmatcher >= ex.matchertimings.dmax > 0
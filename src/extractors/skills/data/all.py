@@ -1,5 +1,7 @@
+from collections.abc import Iterable
+from typing import get_args
 from ...xpatterns import IN, LOWER, OP, propn, ver1
-from ..tag import Skill, Tech
+from ..tag import Group, Skill, Tech
 from ..utils import dis_incontext, dis_namelike, dis_nounlike, dis_precisely, dis_verblike
 from .ai import SKILLS as AI_SKILLS
 from .adobe import SKILLS as ADOBE_SKILLS
@@ -19,24 +21,8 @@ from .industries import SKILLS as INDUSTRIES_SKILLS
 from .topics import SKILLS as TOPICS_SKILLS
 from .languages import SKILLS as LANGUAGE_SKILLS
 
-SKILLS: list[Skill] = [
-  *AI_SKILLS,
-  *ADOBE_SKILLS,
-  *AMAZON_SKILLS,
-  *APACHE_SKILLS,
-  *APPLE_SKILLS,
-  *CISCO_SKILLS,
-  *GOOGLE_SKILLS,
-  *HASHICORP_SKILLS,
-  *META_SKILLS,
-  *MICROSOFT_SKILLS,
-  *YANDEX_SKILLS,
-  # ...
-  *CERTIFICATES_SKILLS,
-  *COMPANIES_SKILLS,
-  *INDUSTRIES_SKILLS,
-  *TOPICS_SKILLS,
-  *LANGUAGE_SKILLS,
+# Skills not belonging to a vendor or a topical module
+COMMON_SKILLS: list[Skill] = [
 
   # ANALYSIS
   Tech("Tableau", ["tableau"]),
@@ -455,6 +441,49 @@ SKILLS: list[Skill] = [
   Tech("tRPC", ["trpc"], "Skill"),
 ]
 
+# Skills by module, in the order of `SKILLS`
+SKILL_MODULES: dict[str, list[Skill]] = {
+  "ai": AI_SKILLS,
+  "adobe": ADOBE_SKILLS,
+  "amazon": AMAZON_SKILLS,
+  "apache": APACHE_SKILLS,
+  "apple": APPLE_SKILLS,
+  "cisco": CISCO_SKILLS,
+  "google": GOOGLE_SKILLS,
+  "hashicorp": HASHICORP_SKILLS,
+  "meta": META_SKILLS,
+  "microsoft": MICROSOFT_SKILLS,
+  "yandex": YANDEX_SKILLS,
+  # ...
+  "certificates": CERTIFICATES_SKILLS,
+  "companies": COMPANIES_SKILLS,
+  "industries": INDUSTRIES_SKILLS,
+  "topics": TOPICS_SKILLS,
+  "languages": LANGUAGE_SKILLS,
+  "common": COMMON_SKILLS,
+}
+
+SKILLS: list[Skill] = [skill for skills in SKILL_MODULES.values() for skill in skills]
+
+def select_skills(groups: Iterable[Group] | None = None, modules: Iterable[str] | None = None) -> list[Skill]:
+  """
+  Skills of the given groups and modules (all if omitted), in the order of `SKILLS`.
+  Note: a narrow selection also drops cancellations by wider matches of the skills left out.
+
+  SkillExtractor(nlp, select_skills(groups=["Certificate", "Company"]))
+  """
+  groupset = set(get_args(Group.__value__) if groups is None else groups)
+  if unknown := groupset - set(get_args(Group.__value__)):
+    raise ValueError(f"unknown skill groups {sorted(unknown)!r}")
+  modulelist = list(SKILL_MODULES if modules is None else modules)
+  if unknown := set(modulelist) - set(SKILL_MODULES):
+    raise ValueError(f"unknown skill modules {sorted(unknown)!r}")
+  return [
+    skill
+    for module, skills in SKILL_MODULES.items() if module in modulelist
+    for skill in skills if skill.group in groupset
+  ]
+
 # // SECURITY TOOLS
 # // Aircrack-ng: 454 repos, 5 users
 # // Nikto: 352 repos -- too many false positives
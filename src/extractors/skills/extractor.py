@@ -1,7 +1,11 @@
-from collections.abc import Callable, Sequence
+from collections.abc import Callable, Iterable, Sequence
+from itertools import chain, pairwise
+from pathlib import Path
+from time import perf_counter
 from spacy import Language
 from spacy.tokens import Doc, Token
-from ..extractor import BaseExtractor
+from ..extractor import BaseExtractor, merge_overlapping
+from ..tiers import TierStats, TokenizerTier
 from ..utils import uniq
 from .tag import Skill
 
@@ -11,11 +15,14 @@ def create_resolve(ss: list[str]) -> Resolve:
   return lambda _: ss
 
 class SkillExtractor(BaseExtractor):
-  def __init__(self, nlp: Language, skills: Sequence[Skill]):
-    super().__init__(nlp, skills)
+  def __init__(self, nlp: Language, skills: Sequence[Skill], snapshots: str | Path | None = None):
+    super().__init__(nlp, skills, snapshots)
     self.groups: dict[str, str] = {}
     self.publicnames: dict[str, str] = {}
     self.resolvers: dict[str, Resolve] = {}
+    self.tokenresolvers: set[str] = set() # skills resolved by functions (of main tokens)
+    self.tier: TokenizerTier | None = None # built on the first tiered extraction
+    self.tierstats = TierStats()
     self.init_matchers2(skills)
 
   def init_matchers2(self, skills: Sequence[Skill]) -> None:
@@ -30,34 +37,124 @@ class SkillExtractor(BaseExtractor):
       # Update resolve fns
       if skill.resolve is not None:
         assert skill.name not in self.resolvers, f"duplicate `resolve` at {skill.name!r}"
-        self.resolvers[skill.name] = create_resolve(skill.resolve) if isinstance(skill.resolve, list) else skill.resolve
+        if isinstance(skill.resolve, list):
+          self.resolvers[skill.name] = create_resolve(skill.resolve)
+        else:
+          self.resolvers[skill.name] = skill.resolve
+          self.tokenresolvers.add(skill.name)
+
+  def check_tags(self, skills: Sequence[Skill]) -> None: # type: ignore[override]
+    super().check_tags(skills)
+    publicnames = set(self.publicnames)
+    resolvers = set(self.resolvers)
+    for skill in skills:
+      if skill.publicname is not None:
+        if skill.name in publicnames:
+          raise ValueError(f"duplicate `publicname` at {skill.name!r}")
+        publicnames.add(skill.name)
+      if skill.resolve is not None:
+        if skill.name in resolvers:
+          raise ValueError(f"duplicate `resolve` at {skill.name!r}")
+        resolvers.add(skill.name)
+
+  def add_tags(self, skills: Sequence[Skill]) -> None: # type: ignore[override]
+    super().add_tags(skills)
+    self.init_matchers2(skills)
+    self.tier = None
+
+  def remove_tags(self, names: Iterable[str]) -> None:
+    names = set(names)
+    super().remove_tags(names)
+    for name in names:
+      self.groups.pop(name, None)
+      self.publicnames.pop(name, None)
+      self.resolvers.pop(name, None)
+      self.tokenresolvers.discard(name)
+    self.tier = None
 
   def extract_many(self, text_or_docs: Sequence[str | Doc]) -> list[list[str]]:
     if not text_or_docs:
       return []
-    docs = self.nlp.pipe(text_or_docs) if isinstance(text_or_docs[0], str) else text_or_docs
-    # LATER: `n_process` for multiprocessing
+    docs = self.pipe(text_or_docs) if isinstance(text_or_docs[0], str) else text_or_docs
+    # For multiprocessing, see `pool.ExtractorPool`
     return [self.extract(doc) for doc in docs]
 
   def extract(self, text_or_doc: str | Doc) -> list[str]:
-    doc = self.nlp(text_or_doc) if isinstance(text_or_doc, str) else text_or_doc
+    doc = self.parse(text_or_doc) if isinstance(text_or_doc, str) else text_or_doc
     # pprint(list(self.nlp.tokenizer.explain(text_or_doc)))
     # pprint([{
     #   "token": tok, "pos": tok.pos_, "dep": tok.dep_, "head": tok.head} for tok in doc
     # ]) # if not tok.is_punct
-    umatches, _ = self.find_umatches(doc)
+    umatches, _ = self.find_uarrays(doc)
+    return self.resolve_skills(doc, umatches.names(), umatches.mains)
+
+  def resolve_skills(self, doc: Doc, names: Sequence[str], mains: Sequence[int]) -> list[str]:
+    t0 = perf_counter() if self.sink else 0.0
     # Resolve skills
     skills: list[str] = []
-    for name, _, maintoken in umatches:
+    resolved = 0
+    for name, main in zip(names, mains, strict=True):
       if name in self.resolvers:
-        skills += self.resolvers[name](maintoken)
+        skills += self.resolvers[name](doc[main])
+        resolved += 1
       else:
         skills.append(name)
     # Uniquelize and dealias skills
-    return [
+    skills2 = [
       self.to_publicname(s)
       for s in uniq(skills)
     ]
+    if self.sink:
+      self.emit("postprocess", t0, resolved=resolved, skills=len(skills2))
+    return skills2
+
+  def extract_many_tiered(self, texts: Sequence[str]) -> list[list[str]]:
+    """
+    Extract skills as `extract_many`, parsing only the texts which need it (see `extract_unparsed`)
+    """
+    results = [self.extract_unparsed(self.nlp.make_doc(text)) for text in texts]
+    parsed = [k for k, result in enumerate(results) if result is None]
+    for k, doc in zip(parsed, self.pipe([texts[k] for k in parsed]), strict=True):
+      results[k] = self.extract(doc)
+    return [result or [] for result in results]
+
+  def extract_tiered(self, text: str) -> list[str]:
+    skills = self.extract_unparsed(self.nlp.make_doc(text))
+    return self.extract(text) if skills is None else skills
+
+  def extract_unparsed(self, doc: Doc) -> list[str] | None:
+    """
+    Extract skills from a tokenizer-only doc, the same as from the parsed doc: `None` if the parse could change them.
+    It can't if no pattern needing the parse can match, matches are unambiguous, their resolvers don't look
+    at tokens and they don't overlap (so they're in the same order whatever their main tokens are).
+    """
+    if self.tier is None:
+      self.tier = TokenizerTier(self)
+    stats = self.tierstats
+    stats.docs += 1
+    rawmatches = self.tier.match(doc)
+    if rawmatches is None:
+      stats.patterns += 1
+      return None
+    for match_id, _, _ in chain(rawmatches.pmatches, rawmatches.xmatches):
+      entry = self.matchtable[match_id]
+      if entry.name != entry.mname:
+        stats.ambiguous += 1
+        return None
+    tmatches = self.find_tmatches(doc, rawmatches)
+    spans = sorted(
+      (min(offsets), max(offsets), name)
+      for name, offsets in merge_overlapping([(tmatch.name, set(tmatch.offsets)) for tmatch in tmatches])
+      if not name.startswith("-")
+    )
+    if any(name in self.tokenresolvers for _, _, name in spans):
+      stats.resolvers += 1
+      return None
+    if any(end1 >= start2 for (_, end1, _), (start2, _, _) in pairwise(spans)):
+      stats.overlaps += 1
+      return None
+    stats.skipped += 1
+    return self.resolve_skills(doc, [name for _, _, name in spans], [end for _, end, _ in spans])
 
   def to_publicname(self, name: str) -> str:
     if name in self.publicnames:
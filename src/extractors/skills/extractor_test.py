@@ -3,7 +3,7 @@ from collections.abc import Callable
 import pytest
 from spacy import Language
 from ..utils import fix_grammar, normalize
-from .data import SKILLS
+from .data import SKILLS, select_skills
 from .extractor import SkillExtractor
 
 class Test_SkillExtractor:
@@ -532,3 +532,40 @@ class Test_SkillExtractor:
       #oauth
       #hacktoberfest
     """) == {"Open-Source", "Auth0", "Google-Firebase", "Authentication", "AWS-Cognito", "Java", "OAuth"}
+
+class Test_select_skills:
+  def test_select(self) -> None:
+    assert select_skills() == SKILLS
+    assert {skill.group for skill in select_skills(groups=["Language"])} == {"Language"}
+    assert {skill.name for skill in select_skills(modules=["amazon"])} >= {"AWS", "AWS-VPC"}
+    assert not any(skill.name == "AWS" for skill in select_skills(groups=["Language"]))
+    with pytest.raises(ValueError):
+      select_skills(modules=["amazom"])
+
+  def test_extract(self, nlp: Language) -> None:
+    ex = SkillExtractor(nlp, select_skills(groups=["Language"]))
+    assert ex.extract(fix_grammar(normalize("Go/Python/Java, Web/K8S on AWS"))) == ["Go", "Python", "Java"]
+
+class Test_extract_tiered:
+  def test_same_as_extract(self, nlp: Language) -> None:
+    ex = SkillExtractor(nlp, SKILLS)
+    texts = [fix_grammar(normalize(text)) for text in [
+      "Python, Django and PostgreSQL",
+      "Senior PHP developer at Google",
+      "React Native and Kotlin mobile dev, I use Java too",
+      "I'm a freelance manager",
+      "",
+    ]]
+    assert ex.extract_many_tiered(texts) == ex.extract_many(texts)
+    assert [ex.extract_tiered(text) for text in texts] == ex.extract_many(texts)
+    stats = ex.tierstats
+    assert stats.docs == 2 * len(texts)
+    assert stats.skipped + stats.patterns + stats.ambiguous + stats.resolvers + stats.overlaps == stats.docs
+    assert stats.skipped > 0
+
+  def test_tags_changed(self, nlp: Language) -> None:
+    ex = SkillExtractor(nlp, [skill for skill in SKILLS if skill.name == "Python"])
+    assert ex.extract_tiered("python") == ["Python"]
+    ex.remove_tags(["Python"])
+    assert ex.tier is None
+    assert ex.extract_tiered("python") == []
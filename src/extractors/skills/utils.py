@@ -1,8 +1,9 @@
+from functools import lru_cache
 import re
 from spacy.tokens import Token
 from ..extractor import Disambiguate
 from ..ppatterns import to_ppatterns
-from ..spacyhelpers import left_token, right_token
+from ..spacyhelpers import left_token, right_token, sent_lowers
 from ..utils import lookslike
 
 dis_punct = {".", ",", ";", ":", "|", "/", ")"}
@@ -12,23 +13,28 @@ def dis_precisely(*orths: str) -> Disambiguate:
     return token.text in orths
   return disambiguate
 
+# Module-level, so closures of disambiguators hold no cache (they're fingerprinted for snapshots)
+@lru_cache(maxsize=4096)
+def is_marker(lower: str, regmarkers: tuple[re.Pattern[str], ...]) -> bool:
+  return any(lookslike(lower, regmarker) for regmarker in regmarkers)
+
 def dis_incontext(*phrases: str) -> Disambiguate:
   # TODO use matchers to support multi-words combinations
-  regmarkers = [
+  regmarkers = tuple(
     re.compile(rf"{re.escape(marker)}", re.IGNORECASE)
     for marker in to_ppatterns(list(phrases))
-  ]
+  )
   def disambiguate(token: Token) -> bool:
     ltoken = left_token(token)
     if ltoken and ltoken.text == "#":
       # Hashtagged
       return True
-    for tok in token.sent:
-      if tok != token:
-        lower = tok.lower_
-        if any(lookslike(lower, regmarker) for regmarker in regmarkers):
-          return True
-    return False
+    # Other tokens of the sentence, by their distinct lowers
+    return any(
+      is_marker(lower, regmarkers)
+      for lower, count in sent_lowers(token).items()
+      if count > (lower == token.lower_)
+    )
   return disambiguate
 
 def dis_letterlike() -> Disambiguate:
@@ -114,8 +120,5 @@ def dis_namelike() -> Disambiguate:
       return True
     elif token.is_sent_end and ltoken and ltoken.text in dis_punct:
       return True
-    for tok in token.sent:
-      if tok.lower_ in {"am", "'m", "is", "'s", "name"}:
-        return False
-    return True
+    return sent_lowers(token).keys().isdisjoint({"am", "'m", "is", "'s", "name"})
   return disambiguate
@@ -0,0 +1,88 @@
+from dataclasses import fields, is_dataclass
+import functools
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+import re
+from spacy import Language
+from types import BuiltinMethodType, CodeType, FunctionType, MethodType
+from typing import Any
+
+def fingerprint(*values: Any) -> str:
+  """
+  Hash values by content, so a fingerprint stays the same between processes. Unlike `hash` and `repr`,
+  dataclasses, sets and functions (by code, defaults and closure) are hashed recursively.
+  """
+  data = json.dumps(values, default=encode, ensure_ascii=False)
+  return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+def fingerprint_tokenizer(nlp: Language) -> str:
+  """
+  Hash the tokenizer settings (phrases are tokenized into matcher patterns).
+  `Tokenizer.to_bytes` fails on the custom callbacks of `modify_tokenizer`.
+  """
+  tokenizer: Any = nlp.tokenizer
+  return fingerprint(
+    nlp.meta.get("lang"), nlp.meta.get("name"), nlp.meta.get("version"),
+    tokenizer.rules, tokenizer.prefix_search, tokenizer.suffix_search,
+    tokenizer.infix_finditer, tokenizer.token_match, tokenizer.url_match,
+  )
+
+def fingerprint_pipeline(nlp: Language) -> str:
+  """
+  Hash what a parse depends on: the model, the tokenizer settings, the components
+  and the attribute ruler's patterns (see `add_dev_exceptions`)
+  """
+  ruler: Any = nlp.get_pipe("attribute_ruler") if "attribute_ruler" in nlp.pipe_names else None
+  return fingerprint(fingerprint_tokenizer(nlp), nlp.pipe_names, ruler.patterns if ruler else None)
+
+def encode(value: Any) -> Any:
+  """
+  JSON-encode values `json` doesn't know about. Values without a stable encoding
+  (e.g. a `repr` with an address) raise `TypeError`.
+  """
+  if is_dataclass(value) and not isinstance(value, type):
+    return [type(value).__qualname__, *(getattr(value, field.name) for field in fields(value))]
+  elif isinstance(value, set | frozenset):
+    return sorted(fingerprint(v) for v in value)
+  elif isinstance(value, FunctionType):
+    closure = [cell.cell_contents for cell in value.__closure__ or []]
+    return [value.__module__, value.__qualname__, value.__code__, value.__defaults__, closure]
+  elif isinstance(value, CodeType):
+    return [value.co_code.hex(), value.co_consts, value.co_names]
+  elif isinstance(value, MethodType | BuiltinMethodType):
+    return [value.__name__, value.__self__]
+  elif isinstance(value, functools.partial):
+    return [value.func, value.args, value.keywords]
+  elif isinstance(value, re.Pattern):
+    return [value.pattern, value.flags] # `repr` truncates long patterns
+  elif isinstance(value, bytes):
+    return hashlib.sha256(value).hexdigest()
+  cls: Any = type(value)
+  text = repr(value)
+  if cls.__repr__ is object.__repr__ or " at 0x" in text:
+    # The address changes between processes: such a fingerprint would never match a snapshot
+    raise TypeError(f"can't fingerprint {type(value).__qualname__}, its repr isn't stable: {text}")
+  return text
+
+def read_snapshot(path: Path) -> Any | None:
+  """
+  Unpickle a snapshot (keep snapshot dirs private: unpickling runs arbitrary code), `None` if unreadable
+  """
+  try:
+    with open(path, "rb") as file:
+      return pickle.load(file)
+  except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+    return None
+
+def write_snapshot(path: Path, snapshot: Any) -> None:
+  """
+  Pickle a snapshot atomically, so concurrent workers never read a partial file
+  """
+  path.parent.mkdir(parents=True, exist_ok=True)
+  tmppath = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+  with open(tmppath, "wb") as file:
+    pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+  os.replace(tmppath, path)
@@ -0,0 +1,56 @@
+# mypy: disable-error-code=no-untyped-def
+from functools import lru_cache
+import os
+from pathlib import Path
+import pytest
+import re
+import subprocess
+import sys
+from .snapshots import fingerprint, read_snapshot, write_snapshot
+
+def create_pred(*words: str):
+  return lambda text: any(word in text for word in words)
+
+class Test_fingerprint:
+  def test_data(self) -> None:
+    assert fingerprint(["a", {"LOWER": "b"}]) == fingerprint(["a", {"LOWER": "b"}])
+    assert fingerprint(["a", {"LOWER": "b"}]) != fingerprint(["a", {"LOWER": "c"}])
+    assert fingerprint({"b", "a", "c"}) == fingerprint({"c", "b", "a"})
+    assert fingerprint(re.compile("x" * 300)) != fingerprint(re.compile("x" * 301))
+
+  def test_functions(self) -> None:
+    assert fingerprint(create_pred("a")) == fingerprint(create_pred("a"))
+    assert fingerprint(create_pred("a")) != fingerprint(create_pred("b"))
+    assert fingerprint(lambda x: x + 1) != fingerprint(lambda x: x + 2)
+
+  def test_unstable(self) -> None:
+    with pytest.raises(TypeError):
+      fingerprint(object())
+    with pytest.raises(TypeError):
+      fingerprint(lru_cache(lambda x: x))
+
+  def test_processes(self) -> None:
+    # Snapshots are shared between processes: fingerprints of tags must not depend on object addresses
+    assert fingerprint_tags() == fingerprint_tags()
+
+FINGERPRINT_TAGS = """
+from extractors.categories.data import TAGS as CATEGORY_TAGS
+from extractors.experience.data import TAGS as EXPERIENCE_TAGS
+from extractors.skills.data import SKILLS
+from extractors.snapshots import fingerprint
+from extractors.title.data import TAGS as TITLE_TAGS
+print(*(fingerprint(tags) for tags in [SKILLS, CATEGORY_TAGS, TITLE_TAGS, EXPERIENCE_TAGS]))
+"""
+
+def fingerprint_tags() -> str:
+  env = {**os.environ, "PYTHONPATH": str(Path(__file__).parents[1])}
+  return subprocess.run([sys.executable, "-c", FINGERPRINT_TAGS], env=env, capture_output=True, text=True, check=True).stdout
+
+class Test_snapshot:
+  def test_roundtrip(self, tmp_path) -> None:
+    path = tmp_path / "dir" / "snapshot.pickle"
+    assert read_snapshot(path) is None
+    write_snapshot(path, {"a": [1, 2]})
+    assert read_snapshot(path) == {"a": [1, 2]}
+    path.write_bytes(b"junk")
+    assert read_snapshot(path) is None
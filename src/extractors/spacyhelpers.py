@@ -1,4 +1,8 @@
-from spacy.tokens import Token
+from collections import Counter
+from typing import NamedTuple
+from weakref import WeakKeyDictionary
+import numpy as np
+from spacy.tokens import Doc, Token
 
 (IN, IS_PUNCT, IS_SENT_START, LOWER, OP, ORTH, POS, REGEX, TAG) = (
   "IN", "IS_PUNCT", "IS_SENT_START", "LOWER", "OP", "ORTH", "POS", "REGEX", "TAG"
@@ -8,11 +12,102 @@ from spacy.tokens import Token
 def is_word(token: Token) -> bool:
   return not token.is_punct and not token.is_space
 
+# TREE
+class DocTree(NamedTuple):
+  """
+  Per-doc token offsets of heads, depths and sentence bounds, computed in a single pass.
+  Lets tree walks run over ints instead of creating `Token` objects on every step.
+  """
+  heads: list[int]       # absolute offset of the head (a sentence root is its own head)
+  deps: list[int]        # dependency label ids
+  depths: list[int]      # distance to the sentence root
+  sent_starts: list[int] # offset of the sentence start
+  sent_ends: list[int]   # offset of the sentence end (exclusive)
+
+  def ancestors(self, i: int) -> list[int]:
+    heads = self.heads
+    offsets: list[int] = []
+    while heads[i] != i:
+      i = heads[i]
+      offsets.append(i)
+    return offsets
+
+# Trees are cached per doc, without storing them in `doc.user_data` (which is serialized with the doc)
+_trees: WeakKeyDictionary[Doc, DocTree] = WeakKeyDictionary()
+
+def doc_tree(doc: Doc) -> DocTree:
+  tree = _trees.get(doc)
+  if tree is None:
+    tree = _trees[doc] = build_tree(doc)
+  return tree
+
+def build_tree(doc: Doc) -> DocTree:
+  n = len(doc)
+  # `HEAD` is stored as a relative offset, in uint64
+  heads: list[int] = (np.arange(n, dtype=np.int64) + doc.to_array("HEAD").view(np.int64)).tolist()
+  deps: list[int] = doc.to_array("DEP").tolist()
+  sent_starts, sent_ends = [0] * n, [0] * n
+  for sent in doc.sents:
+    start, end = sent.start, sent.end
+    sent_starts[start:end] = [start] * (end - start)
+    sent_ends[start:end] = [end] * (end - start)
+  depths = [-1] * n
+  for i in range(n):
+    path: list[int] = []
+    j = i
+    while depths[j] < 0 and heads[j] != j:
+      path.append(j)
+      j = heads[j]
+    if depths[j] < 0:
+      depths[j] = 0
+    depth = depths[j]
+    for k in reversed(path):
+      depth += 1
+      depths[k] = depth
+  return DocTree(heads, deps, depths, sent_starts, sent_ends)
+
+# Ancestors of every token as a bitmask of offsets, cached per doc like trees.
+# `masks[i] >> j & 1` tells whether token `j` is an ancestor of token `i` without walking the tree.
+_ancestor_masks: WeakKeyDictionary[Doc, list[int]] = WeakKeyDictionary()
+
+def ancestor_masks(doc: Doc) -> list[int]:
+  masks = _ancestor_masks.get(doc)
+  if masks is None:
+    tree = doc_tree(doc)
+    heads = tree.heads
+    masks = [0] * len(doc)
+    for i in sorted(range(len(doc)), key=tree.depths.__getitem__): # heads before their children
+      head = heads[i]
+      if head != i:
+        masks[i] = masks[head] | 1 << head
+    _ancestor_masks[doc] = masks
+  return masks
+
+# SENTENCES
+# Lowers of sentences (with counts) for context checks, cached per doc like trees
+_sent_lowers: WeakKeyDictionary[Doc, dict[int, Counter[str]]] = WeakKeyDictionary()
+
+def sent_lowers(token: Token) -> Counter[str]:
+  """
+  Lowers of the token's sentence, counted
+  """
+  doc = token.doc
+  sents = _sent_lowers.get(doc)
+  if sents is None:
+    sents = _sent_lowers[doc] = {}
+  tree = doc_tree(doc)
+  start = tree.sent_starts[token.i]
+  lowers = sents.get(start)
+  if lowers is None:
+    lowers = sents[start] = Counter(tok.lower_ for tok in doc[start:tree.sent_ends[token.i]])
+  return lowers
+
 # LEFT
 def left_tokens(token: Token | None) -> list[Token]:
   if not token:
     return []
-  return list(token.doc[token.sent.start:token.i])
+  doc = token.doc
+  return list(doc[doc_tree(doc).sent_starts[token.i]:token.i])
 
 def left_token(token: Token | None) -> Token | None:
   if not token:
@@ -24,7 +119,8 @@ def left_token(token: Token | None) -> Token | None:
 def right_tokens(token: Token | None) -> list[Token]:
   if not token:
     return []
-  return list(token.doc[token.i+1:token.sent.end])
+  doc = token.doc
+  return list(doc[token.i+1:doc_tree(doc).sent_ends[token.i]])
 
 def right_token(token: Token | None) -> Token | None:
   if not token:
@@ -34,27 +130,21 @@ def right_token(token: Token | None) -> Token | None:
 
 # LEVELS
 def ancestors(token: Token) -> list[Token]:
-  tok = token
-  toks: list[Token] = []
-  while tok != tok.head:
-    tok = tok.head
-    toks.append(tok)
-  return toks
+  doc = token.doc
+  return [doc[i] for i in doc_tree(doc).ancestors(token.i)]
 
 def right_ancestors(token: Token) -> list[Token]:
-  tok = token
+  doc = token.doc
+  heads = doc_tree(doc).heads
+  i = token.i
   toks: list[Token] = []
-  while tok != tok.head:
-    tok = tok.head
-    if tok.i > token.i:
-      toks.append(tok)
+  while heads[i] != i:
+    i = heads[i]
+    if i > token.i:
+      toks.append(doc[i])
     else:
       break
   return toks
 
 def token_level(token: Token) -> int:
-  level = 0
-  while token != token.sent.root:
-    level += 1
-    token = token.head
-  return level
+  return doc_tree(token.doc).depths[token.i]
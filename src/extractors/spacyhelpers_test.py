@@ -0,0 +1,68 @@
+# mypy: disable-error-code=no-untyped-def
+from collections import Counter
+import pytest
+from spacy import Language
+from spacy.tokens import Token
+from .spacyhelpers import ancestor_masks, ancestors, doc_tree, left_tokens, right_ancestors, right_tokens, sent_lowers, token_level
+
+TEXTS = [
+  "Senior PHP developer at Google.",
+  "I'm a freelance manager. Looking for a job in data science, not a developer!",
+  "Computer/Data Science student; ex Java engineer",
+]
+
+def walk_level(token: Token) -> int:
+  level = 0
+  while token != token.sent.root:
+    level += 1
+    token = token.head
+  return level
+
+def walk_ancestors(token: Token) -> list[Token]:
+  toks: list[Token] = []
+  while token != token.head:
+    token = token.head
+    toks.append(token)
+  return toks
+
+def walk_right_ancestors(token: Token) -> list[Token]:
+  tok = token
+  toks: list[Token] = []
+  while tok != tok.head:
+    tok = tok.head
+    if tok.i > token.i:
+      toks.append(tok)
+    else:
+      break
+  return toks
+
+class Test_doc_tree:
+  @pytest.fixture(scope="class")
+  def docs(self, nlp: Language):
+    return list(nlp.pipe(TEXTS))
+
+  def test_same_as_tree_walks(self, docs) -> None:
+    for doc in docs:
+      for token in doc:
+        assert token_level(token) == walk_level(token)
+        assert ancestors(token) == walk_ancestors(token)
+        assert right_ancestors(token) == walk_right_ancestors(token)
+        assert left_tokens(token) == list(token.doc[token.sent.start:token.i])
+        assert right_tokens(token) == list(token.doc[token.i+1:token.sent.end])
+
+  def test_cached(self, docs) -> None:
+    assert doc_tree(docs[0]) is doc_tree(docs[0])
+    assert doc_tree(docs[0]) is not doc_tree(docs[1])
+
+  def test_sent_lowers(self, docs) -> None:
+    for doc in docs:
+      for token in doc:
+        assert sent_lowers(token) == Counter(tok.lower_ for tok in token.sent)
+    assert sent_lowers(docs[1][0]) is sent_lowers(docs[1][1])
+
+  def test_ancestor_masks(self, docs) -> None:
+    for doc in docs:
+      masks = ancestor_masks(doc)
+      for token in doc:
+        assert [j for j in range(len(doc)) if masks[token.i] >> j & 1] == sorted(tok.i for tok in walk_ancestors(token))
+    assert ancestor_masks(docs[0]) is ancestor_masks(docs[0])
@@ -0,0 +1,73 @@
+"""
+Tiered analysis: match a tokenizer-only doc first, and run the statistical components
+(tagger, parser, etc.) only when the parse can change the result.
+"""
+from dataclasses import dataclass
+from spacy.tokens import Doc
+from .extractor import BaseExtractor, RawMatches, run_matchers
+from .prefilter import AnchoredMatcher, PrefilterStats, doc_lowers, xpattern_anchor
+from .xpatterns import XPattern
+
+# Token attributes a tokenizer-only doc has (lexical ones), patterns on other attributes need the parse
+TOKENIZER_ATTRS = {
+  "ORTH", "TEXT", "LOWER", "LENGTH", "SHAPE", "PREFIX", "SUFFIX",
+  "IS_ALPHA", "IS_ASCII", "IS_DIGIT", "IS_LOWER", "IS_UPPER", "IS_TITLE", "IS_PUNCT", "IS_SPACE", "IS_STOP",
+  "LIKE_NUM", "LIKE_URL", "LIKE_EMAIL", "OP",
+}
+
+def needs_parse(xpattern: XPattern) -> bool:
+  return any(attr.upper() not in TOKENIZER_ATTRS for xtoken in xpattern for attr in xtoken)
+
+@dataclass
+class TierStats:
+  docs: int = 0      # docs checked
+  skipped: int = 0   # docs extracted from tokenizer-only docs
+  patterns: int = 0  # parsed: patterns needing the parse could match
+  ambiguous: int = 0 # parsed: ambiguous matches (disambiguation looks at the parse)
+  resolvers: int = 0 # parsed: resolvers looking at tokens
+  overlaps: int = 0  # parsed: overlapping matches (their order depends on main tokens)
+
+  @property
+  def skip_rate(self) -> float:
+    return self.skipped / self.docs if self.docs else 0.0
+
+class TokenizerTier:
+  """
+  Matchers of an extractor for tokenizer-only docs: the phrase matcher and the xpatterns on tokenizer attributes.
+  Of the xpatterns needing the parse, and of dependency patterns, only anchors are checked.
+  Built from the extractor's matchers, so it must be rebuilt when its tags change.
+  """
+
+  def __init__(self, extractor: BaseExtractor):
+    self.extractor = extractor
+    strings = extractor.nlp.vocab.strings
+    self.xmatcher = AnchoredMatcher(extractor.nlp.vocab, validate=False) # patterns are validated by the extractor
+    self.parseanchors: set[int] = set() # lowers of which a doc has one if xpatterns needing the parse can match it
+    self.parseunanchored = False        # some xpatterns needing the parse have no anchors
+    self.prefilter = PrefilterStats()
+    for match_id in extractor.matchtable:
+      key = strings[match_id]
+      if key not in extractor.xmatcher:
+        continue
+      xpatterns: list[XPattern] = extractor.xmatcher.get(key)[1]
+      if tokenizer_xpatterns := [xpattern for xpattern in xpatterns if not needs_parse(xpattern)]:
+        self.xmatcher.add(key, tokenizer_xpatterns)
+      for xpattern in xpatterns:
+        if needs_parse(xpattern):
+          anchor = xpattern_anchor(strings, xpattern)
+          if anchor is None:
+            self.parseunanchored = True
+          else:
+            self.parseanchors |= anchor
+
+  def can_skip_parse(self, doc: Doc) -> bool:
+    lowers = doc_lowers(doc)
+    return not self.parseunanchored and self.parseanchors.isdisjoint(lowers) and not self.extractor.dmatcher.groups_for(lowers)
+
+  def match(self, doc: Doc) -> RawMatches | None:
+    """
+    Raw matches of a tokenizer-only doc (the same as of the parsed doc), `None` if patterns needing the parse could match it
+    """
+    if not self.can_skip_parse(doc):
+      return None
+    return run_matchers(doc, self.extractor.pmatcher, self.xmatcher, self.extractor.dmatcher, self.prefilter)
@@ -0,0 +1,24 @@
+# mypy: disable-error-code=no-untyped-def
+from spacy import Language
+from .extractor import BaseExtractor, Tag
+from .tiers import TokenizerTier, needs_parse
+
+class Test_needs_parse:
+  def test_smoke(self) -> None:
+    assert not needs_parse([{"LOWER": "react"}, {"ORTH": "-", "OP": "?"}, {"LOWER": {"REGEX": "^js$"}}])
+    assert not needs_parse([{"lower": "react"}, {"IS_PUNCT": True}])
+    assert needs_parse([{"LOWER": "react"}, {"POS": "NOUN"}])
+    assert needs_parse([{"IS_SENT_START": True}])
+
+class Test_TokenizerTier:
+  def test_match(self, nlp: Language) -> None:
+    ex = BaseExtractor(nlp, [
+      Tag("Go", ["golang", [{"LOWER": "go"}, {"LOWER": {"REGEX": "^v?\\d+$"}}]], "", False, None),
+      Tag("Rust", [[{"LOWER": "rust"}, {"POS": "NOUN"}]], "", False, None),
+    ])
+    tier = TokenizerTier(ex)
+    assert tier.parseanchors == {nlp.vocab.strings["rust"]}
+    rawmatches = tier.match(nlp.make_doc("golang and go 1"))
+    assert rawmatches is not None
+    assert len(rawmatches.pmatches) == 1 and len(rawmatches.xmatches) == 1
+    assert tier.match(nlp.make_doc("rust lang")) is None
@@ -1,63 +1,88 @@
-from collections.abc import Sequence
+from collections.abc import Iterable, Sequence
 from itertools import dropwhile
 import re
-from typing import Literal
+from time import perf_counter
+from typing import Literal, NamedTuple
+from weakref import WeakKeyDictionary
 
 from spacy.tokens import Doc, Span, Token
 from ..categories.extractor import is_hashtagged
 from ..extractor import BaseExtractor
 from ..markers import is_future, is_negated, is_past
+from ..spacyhelpers import doc_tree
 from ..utils import LB, RB
 
+type TitleFilter = Literal["Human", "Org"]
+
 class TitleExtractor(BaseExtractor):
-  def extract_many(self, text_or_docs: Sequence[str | Doc], tagfilter: Literal["Human", "Org"]) -> list[str]:
+  def extract_many(self, text_or_docs: Sequence[str | Doc], tagfilter: TitleFilter) -> list[str]:
+    return [titles[tagfilter] for titles in self.extract_many_titles(text_or_docs, [tagfilter])]
+
+  def extract_many_titles(self, text_or_docs: Sequence[str | Doc], tagfilters: Sequence[TitleFilter]) -> list[dict[TitleFilter, str]]:
     if not text_or_docs:
       return []
-    docs = self.nlp.pipe(text_or_docs) if isinstance(text_or_docs[0], str) else text_or_docs
-    # LATER: `n_process` for multiprocessing
-    return [self.extract(doc, tagfilter=tagfilter) for doc in docs]
+    docs = self.pipe(text_or_docs) if isinstance(text_or_docs[0], str) else text_or_docs
+    # For multiprocessing, see `pool.ExtractorPool`
+    return [self.extract_titles(doc, tagfilters) for doc in docs]
+
+  def extract(self, text_or_doc: str | Doc, tagfilter: TitleFilter) -> str:
+    return self.extract_titles(text_or_doc, [tagfilter])[tagfilter]
 
-  def extract(self, text_or_doc: str | Doc, tagfilter: Literal["Human", "Org"]) -> str:
-    doc = self.nlp(text_or_doc) if isinstance(text_or_doc, str) else text_or_doc
+  def extract_titles(self, text_or_doc: str | Doc, tagfilters: Sequence[TitleFilter]) -> dict[TitleFilter, str]:
+    """
+    Extract a title per tagfilter, matching once: the matches, ignored tokens and marker checks are shared
+    """
+    doc = self.parse(text_or_doc) if isinstance(text_or_doc, str) else text_or_doc
     # pprint(list(self.nlp.tokenizer.explain(text_or_doc)))
     # pprint([{"token": tok, "pos": tok.pos_, "dep": tok.dep_, "head": tok.head} for tok in doc if not tok.is_punct])
 
-    umatches, unmatches = self.find_umatches(doc)
-    ignore_tokens = [tok for _, tokens, _ in unmatches for tok in tokens]
-    # print("umatches:", umatches)
-    # print("ignore_tokens:", ignore_tokens)
+    umatches, unmatches = self.find_uarrays(doc)
+    t0 = perf_counter() if self.sink else 0.0
+    ignored = offset_mask(unmatches.offsets)
 
     # Filter umatches additionally (TODO apply the same role canceling we do in `CategoryExtractor`)
-    umatches2 = [
-      (name, tokens, maintoken)
-      for name, tokens, maintoken in umatches
-      if (name == tagfilter or name.startswith(tagfilter + ":")) and (
-        maintoken.head.text.startswith("@") or
+    candidates = [
+      (name, maintoken)
+      for k, name in enumerate(umatches.names())
+      if (maintoken := umatches.maintoken(k)).head.text.startswith("@") or (
         maintoken.dep_ not in {"amod", "compound", "dobj", "pobj"} or
         maintoken.dep_ == "pobj" and maintoken.head.lower_ == "as"
         # ^ TODO maybe analize a verb instead
       )
     ]
-    # print("umatches2:", umatches2)
-
-    # Extract spans
-    spans: list[Span] = []
-    for _, _, maintoken in umatches2:
-      span = find_noun_span(maintoken, [list(span) for span in spans] + [ignore_tokens])
-      if is_hashtagged(span.root):
-        spans.append(span)
-      elif not any(pred(span.root) for pred in [is_negated, is_past, is_future]):
-        spans.append(span)
-    # print("spans:", spans)
-
-    # Drop overlapping spans (if span.root is in other span – prefer other span)
-    final_spans = [
-      span for span in spans
-      if not any(span.root in other_span for other_span in spans if other_span != span)
-    ]
-    # print("final_spans:", final_spans)
+    rejected: dict[int, bool] = {} # span root offset -> whether it's negated, past or future (and not hashtagged)
+    titles: dict[TitleFilter, str] = {}
+    filtered, spancount = 0, 0
+    for tagfilter in tagfilters:
+      maintokens = [maintoken for name, maintoken in candidates if name == tagfilter or name.startswith(tagfilter + ":")]
+      # print("maintokens:", maintokens)
+
+      # Extract spans
+      spans: list[Span] = []
+      blocked = ignored # ignored and taken tokens
+      for maintoken in maintokens:
+        span = find_noun_span(maintoken, blocked)
+        root = span.root
+        if root.i not in rejected:
+          rejected[root.i] = not is_hashtagged(root) and any(pred(root) for pred in [is_negated, is_past, is_future])
+        if not rejected[root.i]:
+          spans.append(span)
+          blocked |= offset_mask(range(span.start, span.end))
+      # print("spans:", spans)
+
+      # Drop overlapping spans (if span.root is in other span – prefer other span)
+      final_spans = [
+        span for span in spans
+        if not any(span.root in other_span for other_span in spans if other_span != span)
+      ]
+      # print("final_spans:", final_spans)
 
-    return format_spans(final_spans)
+      titles[tagfilter] = format_spans(final_spans)
+      filtered += len(umatches) - len(maintokens)
+      spancount += len(final_spans)
+    if self.sink:
+      self.emit("postprocess", t0, filtered=filtered, spans=spancount)
+    return titles
     # Note: Initially I planned to keep "former" titles if nothing else is found.
     #       But some forms, e.g. "I was a web engineer" require a reformatting, like
     #       "Ex Web Engineer", which does not fit the current span-only implementation.
@@ -73,34 +98,85 @@ def is_hanging(token: Token) -> bool:
     return token.tag_ != "VBN" # Smth like "embedded" (VBN) -> False, otherwise -> True
   return True
 
-def find_noun_span(token: Token, acc_spans: list[list[Token]]) -> Span:
-  toks: list[Token] = []
-  for tok in token.sent:
-    if tok.is_punct:
-      continue
-    if tok == token:
-      toks.append(tok) # [Developer]
-    if not any(tok in span for span in acc_spans):
-      if tok.text.startswith("@"):
-        toks.append(tok)
-      elif tok.head == token and tok.i < token.i:
-        toks.append(tok) # [Senior] Developer, [Senior] PHP Developer
-      elif tok.head.head == token and tok.i < token.i:
-        toks.append(tok) # [Full]-Stack Developer
-      elif tok.head.head.head == token and tok.i < token.i:
-        toks.append(tok) # [Game] Engine Development Amateur
-      elif tok.head == token and tok.i > token.i and tok.lower_ in {"at", "of"}:
-        toks.append(tok)
-      elif tok.head.head == token and tok.i > token.i and tok.head.lower_ in {"at", "of"}:
-        toks.append(tok)
-  toks = list(dropwhile(is_hanging, toks))
-  toks = list(dropwhile(is_hanging, reversed(toks)))
-  toks = list(reversed(toks))
-  if len(toks):
-    start, end = toks[0].i, toks[-1].i + 1
-    return token.doc[start:end]
-  else:
-    return token.doc[0:0]
+# Noun spans are searched over token offsets. Token sets are bitmasks of offsets (bit `i` is token `i`).
+def offset_mask(offsets: Iterable[int]) -> int:
+  mask = 0
+  for i in offsets:
+    mask |= 1 << i
+  return mask
+
+class SentSpanIndex(NamedTuple):
+  """
+  Candidates of noun spans in a sentence, as offset masks
+  """
+  words: int                  # non-punctuation tokens
+  mentions: int               # tokens starting with "@"
+  descendants: dict[int, int] # token -> children, grandchildren and great-grandchildren
+  preps: dict[int, int]       # token -> "at" and "of" children, children of its "at" and "of" children
+
+_span_indexes: WeakKeyDictionary[Doc, dict[int, SentSpanIndex]] = WeakKeyDictionary()
+
+def sent_span_index(token: Token) -> SentSpanIndex:
+  doc = token.doc
+  indexes = _span_indexes.get(doc)
+  if indexes is None:
+    indexes = _span_indexes[doc] = {}
+  tree = doc_tree(doc)
+  start = tree.sent_starts[token.i]
+  index = indexes.get(start)
+  if index is None:
+    index = indexes[start] = build_span_index(doc, start, tree.sent_ends[token.i])
+  return index
+
+def build_span_index(doc: Doc, start: int, end: int) -> SentSpanIndex:
+  heads = doc_tree(doc).heads
+  words, mentions = 0, 0
+  descendants = dict.fromkeys(range(start, end), 0)
+  preps = dict.fromkeys(range(start, end), 0)
+  atofs = {tok.i for tok in doc[start:end] if tok.lower_ in {"at", "of"}}
+  for tok in doc[start:end]:
+    i, bit = tok.i, 1 << tok.i
+    if not tok.is_punct:
+      words |= bit
+    if tok.text.startswith("@"):
+      mentions |= bit
+    h1 = heads[i]
+    h2 = heads[h1]
+    h3 = heads[h2]
+    descendants[h1] |= bit
+    descendants[h2] |= bit
+    descendants[h3] |= bit
+    if i in atofs:
+      preps[h1] |= bit
+    if h1 in atofs:
+      preps[h2] |= bit
+  return SentSpanIndex(words, mentions, descendants, preps)
+
+def find_noun_span(token: Token, blocked: int = 0) -> Span:
+  """
+  Noun span of a main token, without `blocked` tokens (an offset mask) except the main token:
+  [Senior] Developer, [Senior] PHP Developer (children), [Full]-Stack Developer (grandchildren),
+  [Game] Engine Development Amateur (great-grandchildren), Developer [at @Company], [@Company].
+  Hanging tokens are dropped from both ends.
+  """
+  doc = token.doc
+  t = token.i
+  index = sent_span_index(token)
+  lefts = (1 << t) - 1
+  rights = ~(lefts | 1 << t)
+  candidates = index.words & ((1 << t) | ~blocked & (
+    index.mentions | (index.descendants[t] & lefts) | (index.preps[t] & rights)
+  ))
+  offsets: list[int] = []
+  while candidates:
+    bit = candidates & -candidates
+    offsets.append(bit.bit_length() - 1)
+    candidates ^= bit
+  start = next((i for i in offsets if not is_hanging(doc[i])), None)
+  if start is None:
+    return doc[0:0]
+  end = next(i for i in reversed(offsets) if not is_hanging(doc[i])) + 1
+  return doc[start:end]
 
 def get_token_text(token: Token) -> str:
   # Ensure that tokens are appended with correct case
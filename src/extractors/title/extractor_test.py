@@ -3,7 +3,7 @@ import pytest
 from spacy import Language
 from ..utils import fix_grammar, normalize, omit_parens
 from .data import TAGS
-from .extractor import TitleExtractor, fix_more_grammar
+from .extractor import TitleExtractor, find_noun_span, fix_more_grammar, offset_mask
 
 class Test_TitleExtractor:
   @pytest.fixture(scope="class")
@@ -577,3 +577,26 @@ class Test_TitleExtractor:
 # -> MLOps
 # Should likely be
 # -> ML, Data Engineering, MlOps
+
+class Test_find_noun_span:
+  def test_blocked(self, nlp: Language) -> None:
+    doc = nlp("Senior PHP developer")
+    assert find_noun_span(doc[2]).text == "Senior PHP developer"
+    assert find_noun_span(doc[2], offset_mask([0])).text == "PHP developer"
+    assert find_noun_span(doc[2], offset_mask([0, 1, 2])).text == "developer" # the main token is never blocked
+
+  def test_offset_mask(self) -> None:
+    assert offset_mask([]) == 0
+    assert offset_mask([0, 3, 3]) == 0b1001
+
+class Test_extract_titles:
+  def test_same_as_extract(self, nlp: Language) -> None:
+    ex = TitleExtractor(nlp, TAGS)
+    for text in [
+      "Senior PHP developer at Google",
+      "Founder & CEO @QualiSage | Team Lead | Senior Full-Stack Developer",
+      "Ex engineer, now a data analyst at a startup",
+    ]:
+      doc = nlp(omit_parens(fix_more_grammar(fix_grammar(normalize(text)))))
+      assert ex.extract_titles(doc, ["Human", "Org"]) == {"Human": ex.extract(doc, "Human"), "Org": ex.extract(doc, "Org")}
+      assert ex.extract_many_titles([doc], ["Org"]) == [{"Org": ex.extract(doc, "Org")}]
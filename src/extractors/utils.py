@@ -288,8 +288,9 @@ def get_nlp(name: str | Path="en_core_web_md") -> Language:
 def component(nlp: Language, name: str) -> Callable[[Doc], Doc]:
   del nlp, name
   def index_tokens_by_sents(doc: Doc) -> Doc:
-    for token in doc:
-      token._.i = token.i - token.sent.start
+    for sent in doc.sents:
+      for token in sent:
+        token._.i = token.i - sent.start
     return doc
   return index_tokens_by_sents
 
@@ -67,3 +67,19 @@ def literal(phrase: str) -> XPattern:
     {ORTH: word} for word in re.split(r"(?<=\W)(?=\w)|(?<=\w)(?=\W)", phrase)
     if word.strip()
   ]
+
+def canonical_xtoken(xtoken: XToken) -> XToken:
+  """
+  Order and dedupe `IN` and `NOT_IN` lists, so equal tokens compare equal
+  """
+  return {
+    attr: (
+      {op: sorted(set(v)) if op in (IN, NOT_IN) and isinstance(v, list) and all(isinstance(w, str) for w in v) else v for op, v in value.items()}
+      if isinstance(value, dict) else
+      value
+    )
+    for attr, value in xtoken.items()
+  }
+
+def canonical_xpattern(xpattern: XPattern) -> XPattern:
+  return [canonical_xtoken(xtoken) for xtoken in xpattern]